@@ -6,32 +6,43 @@ Detects speakers as you speak using pyannote.audio
 
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 from datetime import datetime
 from pathlib import Path
 import threading
+import contextlib
+import multiprocessing
 import wave
-import ssl
 import os
+from math import gcd
 from dotenv import load_dotenv
 import warnings
 import torch
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Load environment variables
 load_dotenv()
 
+# Per-chunk output goes through a queue so the transcription loop never blocks on the terminal
+log = logging.getLogger("realtime_speakers")
+log.setLevel(logging.INFO)
+log.propagate = False
+
 # Suppress warnings
 warnings.filterwarnings('ignore', message='.*torchcodec.*')
 warnings.filterwarnings('ignore', category=UserWarning, module='pyannote.audio.core.io')
 warnings.filterwarnings('ignore', category=UserWarning, module='pyannote.audio.models.blocks.pooling')
-
-# Fix SSL
-ssl._create_default_https_context = ssl._create_unverified_context
+# pyannote noise raised on every diarized chunk - filtered once here rather than per call
+warnings.filterwarnings('ignore', message='.*Model was trained with.*')
+warnings.filterwarnings('ignore', message=r'.*std\(\): degrees of freedom.*')
 
 # Imports
 try:
-    import whisper
+    from faster_whisper import WhisperModel, download_model
+    import ctranslate2
     WHISPER_AVAILABLE = True
 except ImportError:
     WHISPER_AVAILABLE = False
@@ -42,17 +53,47 @@ try:
 except ImportError:
     PYANNOTE_AVAILABLE = False
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    from scipy.signal import resample_poly
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+try:
+    import webrtcvad
+    VAD_AVAILABLE = True
+except ImportError:
+    VAD_AVAILABLE = False
+
 # Configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK_DURATION = 15  # Longer chunks for better speaker detection (15 seconds)
+RING_SAMPLES = 1 << 21  # ~131s of backlog at 16kHz; a power of two so positions wrap with a mask
+INT16_SCALE = np.float32(1 / 32768)
+VAD_FRAME_MS = 30
+VAD_RATES = (8000, 16000, 32000, 48000)  # The only rates WebRTC VAD accepts
+MIN_SPEECH_RATIO = 0.1  # Chunks with fewer voiced frames than this skip the models
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-audio_queue = queue.Queue()
+# Audio callback -> transcribe thread hand-off: a preallocated single-producer/
+# single-consumer ring. Cursors are absolute sample counts; only the callback
+# advances w_idx and only the transcribe thread advances r_idx, so no lock.
+ring = np.empty(RING_SAMPLES, dtype=np.int16)  # Raw PCM straight from the device
+w_idx = multiprocessing.Value('q', 0, lock=False)
+r_idx = multiprocessing.Value('q', 0, lock=False)
+data_ready = threading.Event()  # Set by the callback after each write
+dropped_samples = 0
 is_recording = True
 
 
@@ -68,10 +109,99 @@ def list_audio_devices():
 
 
 def audio_callback(indata, frames, time, status):
-    """Callback for audio stream"""
+    """Callback for audio stream - copies into the ring without allocating"""
+    global dropped_samples
     if status:
-        print(f"Audio status: {status}", file=sys.stderr)
-    audio_queue.put(indata.copy())
+        log.warning("Audio status: %s", status)
+
+    write_pos = w_idx.value
+    # Never lap audio the transcribe thread hasn't read yet
+    if write_pos + frames - r_idx.value > RING_SAMPLES:
+        dropped_samples += frames
+        return
+
+    block = np.frombuffer(indata, dtype=np.int16)
+    start = write_pos & (RING_SAMPLES - 1)
+    end = start + frames
+    if end <= RING_SAMPLES:
+        ring[start:end] = block
+    else:
+        split = RING_SAMPLES - start
+        ring[start:] = block[:split]
+        ring[:end - RING_SAMPLES] = block[split:]
+    w_idx.value = write_pos + frames
+    data_ready.set()
+
+
+def read_ring(start, out):
+    """Copy ring samples from absolute position `start` into `out`"""
+    offset = start & (RING_SAMPLES - 1)
+    first = min(len(out), RING_SAMPLES - offset)
+    out[:first] = ring[offset:offset + first]
+    out[first:] = ring[:len(out) - first]
+    return out
+
+
+def native_rate(device_id):
+    """Rate to open the device at: its native rate if we can resample it ourselves, else SAMPLE_RATE"""
+    if not SCIPY_AVAILABLE:
+        return SAMPLE_RATE
+    return int(sd.query_devices(device_id, 'input')['default_samplerate'])
+
+
+def to_model_rate(audio, rate):
+    """Polyphase-resample a float32 chunk captured at `rate` to the models' SAMPLE_RATE"""
+    if rate == SAMPLE_RATE:
+        return audio
+    g = gcd(SAMPLE_RATE, rate)
+    return resample_poly(audio, SAMPLE_RATE // g, rate // g).astype(np.float32, copy=False)
+
+
+def has_speech(vad, pcm, rate, audio):
+    """
+    Whether enough of a chunk's 30 ms frames are voiced to be worth transcribing
+    Reads the raw int16 `pcm` when WebRTC VAD supports `rate`, else the 16 kHz float32 `audio`
+    """
+    if rate not in VAD_RATES:
+        pcm, rate = np.clip(audio * 32767, -32768, 32767).astype(np.int16), SAMPLE_RATE
+    frame = rate * VAD_FRAME_MS // 1000
+    num_frames = len(pcm) // frame
+    needed = max(1, int(num_frames * MIN_SPEECH_RATIO))
+    data = pcm.tobytes()
+    step = frame * 2  # Bytes per frame
+    voiced = 0
+    for i in range(num_frames):
+        if vad.is_speech(data[i * step:(i + 1) * step], rate):
+            voiced += 1
+            if voiced >= needed:
+                return True
+    return False
+
+
+def _dequantize_rms(pcm, out):
+    """
+    Scale int16 PCM into float32 `out` and return its RMS energy
+    Written as a plain loop so Numba fuses the scale and the energy sum into one pass
+    """
+    s = 0.0
+    for i in range(pcm.size):
+        v = pcm[i] * INT16_SCALE
+        out[i] = v
+        s += v * v
+    return np.sqrt(s / pcm.size)
+
+
+def _dequantize_rms_numpy(pcm, out):
+    """NumPy fallback for _dequantize_rms when Numba isn't installed"""
+    np.multiply(pcm, INT16_SCALE, out=out)
+    return float(np.sqrt(np.dot(out, out) / out.size))
+
+
+if NUMBA_AVAILABLE:
+    # Explicit signature: compiled at import (cached on disk), not on the first chunk
+    dequantize_rms = njit("float64(int16[::1], float32[::1])", cache=True, fastmath=True)(_dequantize_rms)
+else:
+    dequantize_rms = _dequantize_rms_numpy
 
 
 class RealtimeSpeakerDetector:
@@ -83,20 +213,31 @@ class RealtimeSpeakerDetector:
         self.pipeline = pipeline
         self.speaker_map = {}  # Map pyannote labels to consistent IDs
         self.next_speaker_id = 1
+        self.use_cuda = torch.cuda.is_available()
+        self._pinned = None  # Page-locked staging buffer for the host->GPU upload
 
-    def detect_speakers(self, audio_data):
+    def detect_speakers(self, audio_data, energy=None):
         """
         Run speaker detection on audio chunk
+        `energy` is the chunk's RMS if the caller already has it
         Returns dominant speaker label
         """
         try:
             # Check if audio has enough energy (not silence)
-            energy = np.sqrt(np.mean(audio_data ** 2))
+            if energy is None:
+                energy = np.sqrt(np.dot(audio_data, audio_data) / audio_data.size)  # One pass, no squared temporary
             if energy < 0.01:  # Very quiet/silence
                 return "Unknown"
 
             # Convert to torch tensor
-            waveform = torch.from_numpy(audio_data).unsqueeze(0).float()
+            if self.use_cuda:
+                # Stage through pinned memory so the upload is an async DMA copy
+                if self._pinned is None or self._pinned.shape[-1] != len(audio_data):
+                    self._pinned = torch.empty((1, len(audio_data)), dtype=torch.float32, pin_memory=True)
+                self._pinned[0].copy_(torch.from_numpy(audio_data))
+                waveform = self._pinned.to("cuda", non_blocking=True)
+            else:
+                waveform = torch.from_numpy(audio_data).unsqueeze_(0)  # Zero-copy view; audio is already float32
 
             # Create audio input dict
             audio_input = {
@@ -104,12 +245,8 @@ class RealtimeSpeakerDetector:
                 "sample_rate": SAMPLE_RATE
             }
 
-            # Suppress warnings during diarization
-            import warnings
-            with warnings.catch_warnings():
-                warnings.filterwarnings('ignore')
-
-                # Run diarization
+            # Run diarization; on GPU run the networks in fp16
+            with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=self.use_cuda):
                 diarization = self.pipeline(audio_input)
 
             # Count speaking time per speaker
@@ -155,14 +292,27 @@ class RealtimeSpeakerDetector:
         return len(self.speaker_map)
 
 
-def transcribe_realtime(model_name="base", hf_token=None):
+def ensure_models(names):
     """
-    Real-time transcription with real-time speaker detection
+    Pre-fetch Whisper weights into the Hugging Face cache so the first session doesn't stall on the download
+    Downloads use normal certificate verification; on failure load_whisper falls back to fetching lazily
     """
-    global is_recording
+    for name in names:
+        with contextlib.suppress(Exception):
+            download_model(name)
+
+
+def load_whisper(model_name):
+    """Load a CTranslate2 Whisper model - int8 on CPU, int8 weights with fp16 compute on CUDA"""
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_name, device="cuda", compute_type="int8_float16")
+    return WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=os.cpu_count())
 
+
+def load_models(model_name="base", hf_token=None):
+    """Load Whisper and (if possible) the speaker detector"""
     print(f"\nLoading Whisper model '{model_name}'...")
-    model = whisper.load_model(model_name)
+    model = load_whisper(model_name)
     print("✓ Whisper loaded")
 
     # Load speaker diarization pipeline
@@ -176,6 +326,8 @@ def transcribe_realtime(model_name="base", hf_token=None):
                 "pyannote/speaker-diarization-3.1",
                 token=hf_token
             )
+            if torch.cuda.is_available():
+                pipeline.to(torch.device("cuda"))
 
             speaker_detector = RealtimeSpeakerDetector(pipeline)
             print("✓ Speaker diarization loaded\n")
@@ -184,6 +336,29 @@ def transcribe_realtime(model_name="base", hf_token=None):
             print(f"\n⚠️  Could not load speaker detection: {e}")
             print("Continuing without speaker detection\n")
 
+    return model, speaker_detector
+
+
+def warm_up_models(model, speaker_detector=None):
+    """Run each model once on dummy audio so lazy init doesn't land on the first real chunk"""
+    chunk_samples = int(CHUNK_DURATION * SAMPLE_RATE / 1024) * 1024
+    # No VAD filter here, otherwise silence never reaches the encoder
+    segments, _ = model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language="en", beam_size=1)
+    list(segments)
+
+    if speaker_detector:
+        # Faint noise - pure silence is skipped by the energy check before pyannote runs
+        noise = np.random.default_rng(0).standard_normal(chunk_samples, dtype=np.float32) * np.float32(0.02)
+        speaker_detector.detect_speakers(noise)
+
+
+def transcribe_realtime(model, speaker_detector=None, model_name="base", capture_rate=SAMPLE_RATE):
+    """
+    Real-time transcription with real-time speaker detection
+    `capture_rate` is the rate the input stream was opened at
+    """
+    global is_recording
+
     # Create output files
     session_time = datetime.now().strftime('%Y%m%d_%H%M%S')
     transcript_file = OUTPUT_DIR / f"transcript_realtime_{session_time}.txt"
@@ -192,20 +367,32 @@ def transcribe_realtime(model_name="base", hf_token=None):
     print(f"📝 Transcript: {transcript_file}")
     print(f"🎵 Audio: {audio_file}\n")
 
-    with open(transcript_file, 'w') as f:
-        f.write(f"Real-time Recording with Speaker Detection\n")
-        f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: Whisper {model_name}")
-        if speaker_detector:
-            f.write(f" + pyannote.audio real-time\n")
-        else:
-            f.write(f"\n")
-        f.write("=" * 70 + "\n\n")
+    # Opened once for the whole session; line-buffered so each entry reaches disk as it's written
+    transcript_fp = open(transcript_file, 'w', buffering=1)
+    transcript_fp.write(f"Real-time Recording with Speaker Detection\n")
+    transcript_fp.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    transcript_fp.write(f"Model: Whisper {model_name}")
+    if speaker_detector:
+        transcript_fp.write(f" + pyannote.audio real-time\n")
+    else:
+        transcript_fp.write(f"\n")
+    transcript_fp.write("=" * 70 + "\n\n")
 
-    audio_chunks = []
-    all_audio = []
+    blocks_per_chunk = int(CHUNK_DURATION * capture_rate / 1024)  # Ring holds device-rate samples
+    chunk_pcm = np.empty(blocks_per_chunk * 1024, dtype=np.int16)  # Read from the ring, reused every chunk
+    chunk_buffer = np.empty(len(chunk_pcm), dtype=np.float32)  # Its float32 form for the models
     chunk_counter = 0
     speaker_stats = {}
+    vad = webrtcvad.Vad(2) if VAD_AVAILABLE else None  # Aggressiveness 0-3
+    # Speaker detection runs here while Whisper decodes on the loop thread;
+    # both ctranslate2 and torch release the GIL in their kernels
+    detector_pool = ThreadPoolExecutor(max_workers=1)
+
+    # Audio goes to disk chunk by chunk as it is transcribed
+    wf = wave.open(str(audio_file), 'wb')
+    wf.setnchannels(CHANNELS)
+    wf.setsampwidth(2)
+    wf.setframerate(capture_rate)  # Saved at the device rate, before resampling
 
     print("=" * 70)
     if speaker_detector:
@@ -217,77 +404,85 @@ def transcribe_realtime(model_name="base", hf_token=None):
     print("  Press Ctrl+C to stop")
     print("=" * 70 + "\n")
 
-    while is_recording or not audio_queue.empty():
-        try:
-            chunk = audio_queue.get(timeout=1)
-            audio_chunks.append(chunk)
-            all_audio.append(chunk)
+    # Records are formatted on this thread and written to stdout by the listener's
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    log.addHandler(queue_handler)
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
 
+    while is_recording or w_idx.value - r_idx.value >= len(chunk_buffer):
+        try:
             # Process every CHUNK_DURATION seconds
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
+            if w_idx.value - r_idx.value >= len(chunk_buffer):
                 chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks).flatten()
-                audio_chunks = []
-
-                print(f"[Chunk {chunk_counter}] ", end="", flush=True)
+                pcm = read_ring(r_idx.value, chunk_pcm)
+                r_idx.value += len(chunk_pcm)
+                wf.writeframes(pcm)
+                # Scale to float32 once per chunk, measuring its energy in the same pass
+                energy = dequantize_rms(pcm, chunk_buffer)
+                audio_float = to_model_rate(chunk_buffer, capture_rate)
+
+                # Silent chunks skip speaker detection and Whisper entirely
+                if vad and not has_speech(vad, pcm, capture_rate, audio_float):
+                    log.info("[Chunk %d] ✗ (silence)\n", chunk_counter)
+                    continue
+
+                # Start speaker detection (if available) alongside transcription
+                detection = None
+                if speaker_detector:
+                    detection = detector_pool.submit(speaker_detector.detect_speakers, audio_float, energy)
 
                 try:
-                    # Convert to float32
-                    audio_float = audio_data.astype(np.float32)
-
-                    # Detect speaker first (if available)
-                    speaker_label = "Unknown"
-                    if speaker_detector:
-                        print("Detecting speaker... ", end="", flush=True)
-                        speaker_label = speaker_detector.detect_speakers(audio_float)
-
                     # Transcribe
-                    print("Transcribing... ", end="", flush=True)
-                    result = model.transcribe(audio_float, language="en", fp16=False)
-                    text = result["text"].strip()
+                    segments, _ = model.transcribe(audio_float, language="en", beam_size=1, vad_filter=True)
+                    text = "".join(segment.text for segment in segments).strip()
+                    speaker_label = detection.result() if detection else "Unknown"
 
                     if text:
                         timestamp = datetime.now().strftime('%H:%M:%S')
                         speaker_stats[speaker_label] = speaker_stats.get(speaker_label, 0) + 1
 
-                        print(f"✓")
-                        print(f"[{speaker_label}] [{timestamp}]")
-                        print(f"{text}\n")
+                        log.info("[Chunk %d] ✓\n[%s] [%s]\n%s\n", chunk_counter, speaker_label, timestamp, text)
 
                         # Write to file immediately
-                        with open(transcript_file, 'a') as f:
-                            f.write(f"[{speaker_label}] [{timestamp}]\n")
-                            f.write(f"{text}\n\n")
+                        transcript_fp.write(f"[{speaker_label}] [{timestamp}]\n")
+                        transcript_fp.write(f"{text}\n\n")
                     else:
-                        print("✗ (silence)\n")
+                        log.info("[Chunk %d] ✗ (silence)\n", chunk_counter)
 
                 except Exception as e:
-                    print(f"✗ Error: {e}\n")
-                    import traceback
-                    traceback.print_exc()
+                    log.exception("[Chunk %d] ✗ Error: %s\n", chunk_counter, e)
+                finally:
+                    if detection:
+                        # The next chunk overwrites the buffer detection reads
+                        wait([detection])
+
+            else:
+                data_ready.wait(timeout=1)
+                data_ready.clear()
 
-        except queue.Empty:
-            continue
         except KeyboardInterrupt:
             break
 
-    # Save audio file
-    if all_audio:
-        print(f"\n💾 Saving audio...")
-        audio_data = np.concatenate(all_audio).flatten()
-        audio_int16 = (audio_data * 32767).astype(np.int16)
+    detector_pool.shutdown()
+    # Drain what's still queued before the summary prints
+    listener.stop()
+    log.removeHandler(queue_handler)
 
-        with wave.open(str(audio_file), 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(2)
-            wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(audio_int16.tobytes())
+    # Keep the partial chunk still in the ring when recording stopped
+    tail = w_idx.value - r_idx.value
+    if tail:
+        wf.writeframes(read_ring(r_idx.value, chunk_pcm[:tail]))
+        r_idx.value += tail
+    wf.close()
 
-        print(f"✓ Audio saved")
+    if dropped_samples:
+        print(f"\n⚠️  Dropped {dropped_samples / capture_rate:.1f}s of audio - transcription fell too far behind")
 
     # Session summary
     print(f"\n📊 Session Summary:")
-    with open(transcript_file, 'a') as f:
+    with transcript_fp as f:
         f.write("\n" + "=" * 70 + "\n")
         f.write("SESSION SUMMARY\n")
         f.write("=" * 70 + "\n\n")
@@ -316,9 +511,12 @@ def main():
 
     if not WHISPER_AVAILABLE:
         print("\nERROR: Whisper not installed!")
-        print("Install with: pip install openai-whisper")
+        print("Install with: pip install faster-whisper")
         sys.exit(1)
 
+    # Fetch the offered model sizes while the device/model prompts are up
+    threading.Thread(target=ensure_models, args=(("tiny", "base"),), daemon=True).start()
+
     if not PYANNOTE_AVAILABLE:
         print("\n⚠️  pyannote.audio not installed!")
         print("Install with: pip install pyannote.audio")
@@ -345,6 +543,11 @@ def main():
     else:
         print("\nUsing default input device")
 
+    # Capture at the device's own rate; chunks are resampled to 16kHz for the models
+    capture_rate = native_rate(device_id)
+    if capture_rate != SAMPLE_RATE:
+        print(f"Capturing at {capture_rate} Hz, resampling to {SAMPLE_RATE} Hz")
+
     # Model selection
     print("\nWhisper model:")
     print("  1. tiny   - Fast")
@@ -352,19 +555,27 @@ def main():
     model_choice = input("Select (1/2) [default: 2]: ").strip()
     model_name = "tiny" if model_choice == "1" else "base"
 
+    # Load and warm up the models before the stream opens, so the first
+    # chunks don't pile up in the ring while weights load
+    model, speaker_detector = load_models(model_name, hf_token)
+    print("Warming up models...")
+    warm_up_models(model, speaker_detector)
+    print("✓ Models ready")
+
     # Start transcription thread
     transcribe_thread = threading.Thread(
         target=transcribe_realtime,
-        args=(model_name, hf_token),
+        args=(model, speaker_detector, model_name, capture_rate),
         daemon=True
     )
     transcribe_thread.start()
 
     try:
-        with sd.InputStream(
+        with sd.RawInputStream(
             device=device_id,
             channels=CHANNELS,
-            samplerate=SAMPLE_RATE,
+            samplerate=capture_rate,
+            dtype='int16',
             callback=audio_callback,
             blocksize=1024
         ):
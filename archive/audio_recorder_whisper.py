@@ -1,43 +1,67 @@
 #!/usr/bin/env python3
 """
 POC: Real-time Audio Recording with Whisper (Local, Offline)
-Uses OpenAI's Whisper model running locally - no internet required!
+Uses Whisper via faster-whisper (CTranslate2) running locally - no internet required!
 """
 
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
+import os
+import argparse
+import platform
+from types import SimpleNamespace
 from datetime import datetime
 from pathlib import Path
 import threading
+import contextlib
+from functools import lru_cache
+import multiprocessing
 import tempfile
 import wave
-import ssl
-import certifi
-
-# Fix SSL certificate verification for downloading Whisper models
-ssl._create_default_https_context = ssl._create_unverified_context
 
 # Whisper imports
 try:
-    import whisper
+    from faster_whisper import WhisperModel, BatchedInferencePipeline, download_model
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    import ctranslate2
     WHISPER_AVAILABLE = True
 except ImportError:
     WHISPER_AVAILABLE = False
-    print("Whisper not available. Install with: pip install openai-whisper")
+    print("Whisper not available. Install with: pip install faster-whisper")
+
+# Apple Silicon: mlx-whisper runs the model on the GPU through Metal
+try:
+    import mlx.core as mx
+    import mlx_whisper
+    from mlx_whisper.transcribe import ModelHolder
+    MLX_AVAILABLE = sys.platform == "darwin" and platform.machine() == "arm64"
+except ImportError:
+    MLX_AVAILABLE = False
 
 # Configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK_DURATION = 5  # Process every 5 seconds (Whisper works better with longer chunks)
+WHISPER_BATCH = 4  # Max backlogged chunks decoded in one batched Whisper pass
+STEP_DURATION = 1.5  # Re-decode the uncommitted audio this often
+WINDOW_DURATION = 10  # Most uncommitted audio held before it's committed regardless
+RING_SAMPLES = 1 << 21  # ~131s of backlog at 16kHz; a power of two so positions wrap with a mask
+INT16_SCALE = np.float32(1 / 32768)
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-audio_queue = queue.Queue()
+# Audio callback -> transcribe thread hand-off: a preallocated single-producer/
+# single-consumer ring. Cursors are absolute sample counts; only the callback
+# advances w_idx and only the transcribe thread advances r_idx, so no lock.
+ring = np.empty(RING_SAMPLES, dtype=np.int16)  # Raw PCM straight from the device
+w_idx = multiprocessing.Value('q', 0, lock=False)
+r_idx = multiprocessing.Value('q', 0, lock=False)
+data_ready = threading.Event()  # Set by the callback after each write
+dropped_samples = 0
 is_recording = True
 
 
@@ -54,13 +78,162 @@ def list_audio_devices():
 
 
 def audio_callback(indata, frames, time, status):
-    """Callback for audio stream"""
+    """Callback for audio stream - copies into the ring without allocating"""
+    global dropped_samples
     if status:
         print(f"Audio status: {status}", file=sys.stderr)
-    audio_queue.put(indata.copy())
+
+    write_pos = w_idx.value
+    # Never lap audio the transcribe thread hasn't read yet
+    if write_pos + frames - r_idx.value > RING_SAMPLES:
+        dropped_samples += frames
+        return
+
+    block = np.frombuffer(indata, dtype=np.int16)
+    start = write_pos & (RING_SAMPLES - 1)
+    end = start + frames
+    if end <= RING_SAMPLES:
+        ring[start:end] = block
+    else:
+        split = RING_SAMPLES - start
+        ring[start:] = block[:split]
+        ring[:end - RING_SAMPLES] = block[split:]
+    w_idx.value = write_pos + frames
+    data_ready.set()
+
+
+def read_ring(start, out):
+    """Copy ring samples from absolute position `start` into `out`"""
+    offset = start & (RING_SAMPLES - 1)
+    first = min(len(out), RING_SAMPLES - offset)
+    out[:first] = ring[offset:offset + first]
+    out[first:] = ring[:len(out) - first]
+    return out
+
+
+class MlxWhisper:
+    """
+    mlx-whisper behind the part of faster-whisper's WhisperModel interface used here
+    fp16 on the Apple Silicon GPU; there is no batched pipeline, so chunks decode one at a time
+    """
+    def __init__(self, model_name):
+        self.repo = f"mlx-community/whisper-{model_name}-mlx"
+        # Fetch and load the weights now into the holder mlx_whisper.transcribe
+        # reuses - same repo and fp16 dtype as transcribe's default
+        ModelHolder.get_model(self.repo, mx.float16)
+
+    def transcribe(self, audio, language="en", word_timestamps=False, **_):
+        result = mlx_whisper.transcribe(
+            audio, path_or_hf_repo=self.repo, language=language, word_timestamps=word_timestamps
+        )
+        segments = [
+            SimpleNamespace(
+                text=segment["text"],
+                start=segment["start"],
+                words=[SimpleNamespace(word=word["word"], end=word["end"]) for word in segment.get("words", [])],
+            )
+            for segment in result["segments"]
+        ]
+        return segments, None
+
+
+def ensure_models(names):
+    """
+    Pre-fetch Whisper weights into the Hugging Face cache so the first session doesn't stall on the download
+    Downloads use normal certificate verification; on failure load_whisper falls back to fetching lazily
+    """
+    for name in names:
+        with contextlib.suppress(Exception):
+            download_model(name)
+
+
+@lru_cache(maxsize=4)  # Later sessions in the same process reuse the resident weights
+def load_whisper(model_name, compute_type=None):
+    """
+    Load Whisper - mlx-whisper on Apple Silicon, otherwise CTranslate2:
+    int8 on CPU, int8 weights with fp16 compute on CUDA
+    `compute_type` overrides the CTranslate2 default (e.g. float32 for comparison runs)
+    """
+    if MLX_AVAILABLE:
+        return MlxWhisper(model_name)
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_name, device="cuda", compute_type=compute_type or "int8_float16")
+    return WhisperModel(model_name, device="cpu", compute_type=compute_type or "int8", cpu_threads=os.cpu_count())
+
+
+def speech_bounds(audio):
+    """Sample range spanning all detected speech in `audio`, or None if it is silent"""
+    timestamps = get_speech_timestamps(audio, VadOptions())
+    if not timestamps:
+        return None
+    return timestamps[0]["start"], timestamps[-1]["end"]
+
+
+def transcribe_batch(model, chunks):
+    """Transcribe equal-length chunks, batching the Whisper decode when there are several"""
+    if len(chunks) == 1 or isinstance(model, MlxWhisper):
+        texts = []
+        for chunk in chunks:
+            segments, _ = model.transcribe(chunk, language="en", beam_size=1, vad_filter=True)
+            texts.append("".join(segment.text for segment in segments).strip())
+        return texts
+
+    # Lay the backlog end to end; the batched pipeline splits it on speech
+    # boundaries and encodes those segments together. Each segment is then
+    # credited to the chunk it starts in.
+    chunk_seconds = len(chunks[0]) / SAMPLE_RATE
+    texts = [[] for _ in chunks]
+    segments, _ = BatchedInferencePipeline(model=model).transcribe(
+        np.concatenate(chunks), language="en", batch_size=WHISPER_BATCH
+    )
+    for segment in segments:
+        idx = min(int(segment.start // chunk_seconds), len(chunks) - 1)
+        texts[idx].append(segment.text)
+    return ["".join(parts).strip() for parts in texts]
+
+
+def hypothesis_words(model, audio, cache=None):
+    """
+    Decode `audio` and return its words as (text, end_seconds) pairs
+    `cache` carries the last round's speech span and words between calls on the same window
+    """
+    # Silero VAD gate - silence never reaches the encoder, and speech is
+    # trimmed to its span so the encoder sees less audio
+    bounds = speech_bounds(audio)
+    if bounds is None:
+        return []
+    # If only non-speech arrived since the last round, Whisper's input is the
+    # same samples as before - reuse that round instead of encoding them again
+    if cache is not None and cache.get("bounds") == bounds:
+        return cache["words"]
+    offset = bounds[0] / SAMPLE_RATE
+    segments, _ = model.transcribe(
+        audio[bounds[0]:bounds[1]], language="en", beam_size=1, vad_filter=True, word_timestamps=True
+    )
+    words = [(word.word, word.end + offset) for segment in segments for word in segment.words]
+    if cache is not None:
+        cache["bounds"], cache["words"] = bounds, words
+    return words
+
+
+def agreed_prefix(prev, words):
+    """Number of leading words two consecutive hypotheses agree on (LocalAgreement-2)"""
+    n = 0
+    for (a, _), (b, _) in zip(prev, words):
+        if a.strip(" .,!?").lower() != b.strip(" .,!?").lower():
+            break
+        n += 1
+    return n
 
 
-def transcribe_worker_whisper(model_name="base"):
+def emit(transcript_fp, text):
+    """Print a committed line and append it to the transcript"""
+    timestamp = datetime.now().strftime('%H:%M:%S')
+    print(f"[{timestamp}] {text}")
+    transcript_fp.write(f"[{timestamp}] {text}\n")
+
+
+def transcribe_worker_whisper(model_name="base", compute_type=None):
     """
     Worker thread using Whisper for transcription
     Models: tiny, base, small, medium, large
@@ -75,71 +248,123 @@ def transcribe_worker_whisper(model_name="base"):
         return
 
     print(f"\nLoading Whisper model '{model_name}'... (this may take a minute)")
-    model = whisper.load_model(model_name)
+    model = load_whisper(model_name, compute_type)
     print("Model loaded! ✓")
 
     session_file = OUTPUT_DIR / f"transcript_whisper_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
     print(f"Transcript will be saved to: {session_file}")
 
-    with open(session_file, 'w') as f:
-        f.write(f"Recording Session: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: Whisper {model_name}\n")
-        f.write("=" * 60 + "\n\n")
-
-    audio_chunks = []
-    chunk_counter = 0
-
-    while is_recording or not audio_queue.empty():
+    # Opened once for the whole session; line-buffered so each entry reaches disk as it's written
+    transcript_fp = open(session_file, 'w', buffering=1)
+    transcript_fp.write(f"Recording Session: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    transcript_fp.write(f"Model: Whisper {model_name}\n")
+    transcript_fp.write("=" * 60 + "\n\n")
+
+    # Incremental decoding: every STEP_DURATION the uncommitted audio is
+    # re-decoded, and words are committed once two consecutive rounds agree on
+    # them. Committed audio is then cut from the front of the window.
+    step_samples = int(STEP_DURATION * SAMPLE_RATE)
+    window = np.empty(int(WINDOW_DURATION * SAMPLE_RATE), dtype=np.float32)  # Uncommitted audio, oldest first
+    window_pcm = np.empty(len(window), dtype=np.int16)  # Staging for new samples read from the ring
+    window_len = 0
+    prev_words = []  # Last round's hypothesis for the uncommitted audio
+    round_cache = {}  # Last decoded speech span, valid until the window is cut
+
+    # Catch-up path when rounds can't keep pace: whole chunks, batch-decoded
+    chunk_samples = int(CHUNK_DURATION * SAMPLE_RATE / 1024) * 1024
+    chunk_pcm = np.empty(chunk_samples, dtype=np.int16)
+    chunk_batch = np.empty((WHISPER_BATCH, chunk_samples), dtype=np.float32)
+
+    while is_recording or w_idx.value > r_idx.value or window_len:
         try:
-            chunk = audio_queue.get(timeout=1)
-            audio_chunks.append(chunk)
-
-            # Process accumulated audio
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
-                chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks).flatten()
-                audio_chunks = []
-
-                print(f"\n[Chunk {chunk_counter}] Transcribing with Whisper...", end=" ")
-
-                try:
-                    # Whisper expects float32 audio normalized to [-1, 1]
-                    audio_float = audio_data.astype(np.float32)
-
-                    # Transcribe
-                    result = model.transcribe(audio_float, language="en", fp16=False)
-                    text = result["text"].strip()
-
+            backlog = w_idx.value - r_idx.value
+
+            if backlog >= WHISPER_BATCH * chunk_samples:
+                # Fallen well behind - commit what the window holds, then
+                # decode a batch of whole chunks in one pass
+                if window_len:
+                    words = hypothesis_words(model, window[:window_len])
+                    text = "".join(word for word, _ in words).strip()
+                    if text:
+                        emit(transcript_fp, text)
+                    window_len = 0
+                    prev_words = []
+                    round_cache.clear()
+
+                batch = []
+                for row in chunk_batch:
+                    pcm = read_ring(r_idx.value, chunk_pcm)
+                    r_idx.value += chunk_samples
+                    batch.append(np.multiply(pcm, INT16_SCALE, out=row))
+                texts = transcribe_batch(model, batch)
+                for text in texts:
                     if text:
-                        timestamp = datetime.now().strftime('%H:%M:%S')
-                        print(f"✓")
-                        print(f"[{timestamp}] {text}")
-
-                        # Write to file
-                        with open(session_file, 'a') as f:
-                            f.write(f"[{timestamp}] {text}\n")
-
-                            # Also write detected language confidence if available
-                            if "language" in result:
-                                f.write(f"    (Language: {result['language']}, "
-                                       f"Confidence: {result.get('language_probability', 0):.2f})\n")
-                    else:
-                        print("✗ (no speech detected)")
-
-                except Exception as e:
-                    print(f"✗ Error: {e}")
-
-        except queue.Empty:
-            continue
+                        emit(transcript_fp, text)
+
+            elif backlog >= step_samples or not is_recording:
+                # Append the new audio, as much as the window has room for
+                n = min(backlog, len(window) - window_len)
+                pcm = read_ring(r_idx.value, window_pcm[:n])
+                r_idx.value += n
+                np.multiply(pcm, INT16_SCALE, out=window[window_len:window_len + n])
+                window_len += n
+
+                words = hypothesis_words(model, window[:window_len], round_cache)
+                agreed = agreed_prefix(prev_words, words)
+                finishing = not is_recording and w_idx.value == r_idx.value
+
+                if finishing or (window_len == len(window) and not agreed):
+                    # Recording is over, or the window filled without two rounds
+                    # agreeing - commit the whole hypothesis and start afresh
+                    agreed = len(words)
+                    cut = window_len
+                elif agreed:
+                    cut = min(window_len, int(words[agreed - 1][1] * SAMPLE_RATE))
+                else:
+                    cut = 0
+
+                text = "".join(word for word, _ in words[:agreed]).strip()
+                if text:
+                    emit(transcript_fp, text)
+
+                # Drop the committed audio; the leftover words' times shift with it
+                window[:window_len - cut] = window[cut:window_len]
+                window_len -= cut
+                prev_words = [(word, end - cut / SAMPLE_RATE) for word, end in words[agreed:]]
+                if cut:
+                    round_cache.clear()
+
+            else:
+                data_ready.wait(timeout=1)
+                data_ready.clear()
+
+        except Exception as e:
+            print(f"✗ Error: {e}")
+            # Don't retry the same audio forever
+            window_len = 0
+            prev_words = []
+            round_cache.clear()
         except KeyboardInterrupt:
             break
 
+    if dropped_samples:
+        print(f"\n⚠️  Dropped {dropped_samples / SAMPLE_RATE:.1f}s of audio - transcription fell too far behind")
+
+    transcript_fp.close()
     print(f"\nSession transcript saved to: {session_file}")
 
 
 def main():
     global is_recording
 
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--compute-type",
+        default=None,
+        help="CTranslate2 compute type (default: int8 on CPU, int8_float16 on CUDA)"
+    )
+    args = parser.parse_args()
+
     print("=" * 60)
     print("  Audio Recording & Whisper Speech-to-Text POC")
     print("  (Offline, No Internet Required)")
@@ -147,12 +372,12 @@ def main():
 
     if not WHISPER_AVAILABLE:
         print("\nERROR: Whisper not installed!")
-        print("Install with: pip install openai-whisper")
-        print("\nNote: Whisper also requires ffmpeg:")
-        print("  macOS: brew install ffmpeg")
-        print("  Linux: sudo apt install ffmpeg")
+        print("Install with: pip install faster-whisper")
         sys.exit(1)
 
+    # Fetch the offered model sizes while the device/model prompts are up
+    threading.Thread(target=ensure_models, args=(("tiny", "base", "small"),), daemon=True).start()
+
     # List devices
     devices = list_audio_devices()
 
@@ -184,7 +409,7 @@ def main():
     # Start transcription worker
     transcribe_thread = threading.Thread(
         target=transcribe_worker_whisper,
-        args=(model_name,),
+        args=(model_name, args.compute_type),
         daemon=True
     )
     transcribe_thread.start()
@@ -195,10 +420,11 @@ def main():
     print("=" * 60 + "\n")
 
     try:
-        with sd.InputStream(
+        with sd.RawInputStream(
             device=device_id,
             channels=CHANNELS,
             samplerate=SAMPLE_RATE,
+            dtype='int16',
             callback=audio_callback,
             blocksize=1024
         ):
@@ -5,27 +5,30 @@ Records audio from your Bluetooth headset and transcribes it to a file
 """
 
 import sounddevice as sd
-import numpy as np
 import queue
 import sys
 import json
 from datetime import datetime
 from pathlib import Path
 import threading
+from collections import deque
+import time
 import wave
 
 # Speech recognition imports
 try:
-    import speech_recognition as sr
-    SR_AVAILABLE = True
+    from google.cloud import speech
+    SPEECH_AVAILABLE = True
 except ImportError:
-    SR_AVAILABLE = False
-    print("SpeechRecognition not available. Install with: pip install SpeechRecognition")
+    SPEECH_AVAILABLE = False
+    print("Google Cloud Speech not available. Install with: pip install google-cloud-speech")
 
 # Configuration
 SAMPLE_RATE = 16000  # 16kHz is standard for speech
 CHANNELS = 1  # Mono audio
-CHUNK_DURATION = 3  # Process audio every 3 seconds
+BLOCK_SIZE = 1024  # Frames per audio callback
+MAX_QUEUED_BLOCKS = 10 * 60 * SAMPLE_RATE // BLOCK_SIZE  # ~10 minutes of backlog before the oldest blocks drop
+STREAM_LIMIT = 290  # Seconds per streaming request (Google caps a stream at ~5 minutes)
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
 
@@ -33,8 +36,12 @@ AUDIO_DIR = Path("recordings")
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-# Queue for audio chunks
-audio_queue = queue.Queue()
+# int16 PCM blocks, streamed to the recognizer as they arrive. One producer
+# and one consumer, so a deque (atomic append/popleft) plus an Event replaces
+# Queue's lock and condition.
+audio_blocks = deque(maxlen=MAX_QUEUED_BLOCKS)
+audio_ready = threading.Event()
+dropped_samples = 0  # Audio the full deque pushed out before the recognizer read it
 transcript_queue = queue.Queue()
 
 # Global flag for stopping
@@ -55,63 +62,88 @@ def list_audio_devices():
 
 def audio_callback(indata, frames, time, status):
     """Callback function for audio stream"""
+    global dropped_samples
     if status:
         print(f"Audio status: {status}", file=sys.stderr)
-    # Put audio data in queue for processing
-    audio_queue.put(indata.copy())
+    # A full deque drops its oldest block on append
+    if len(audio_blocks) == audio_blocks.maxlen:
+        dropped_samples += len(audio_blocks[0]) // 2  # int16 bytes
+    # The stream already delivers LINEAR16 - queue it for streaming as is
+    audio_blocks.append(bytes(indata))
+    audio_ready.set()
+
+
+def next_block(timeout):
+    """Pop the oldest queued audio block, waiting up to `timeout` seconds; None if none arrived"""
+    if not audio_blocks:
+        audio_ready.wait(timeout)
+        audio_ready.clear()
+    try:
+        return audio_blocks.popleft()
+    except IndexError:
+        return None
+
+
+def audio_requests(deadline):
+    """Yield queued audio as streaming requests until recording stops or `deadline` passes"""
+    while is_recording or audio_blocks:
+        if time.monotonic() >= deadline:
+            return
+        audio_bytes = next_block(timeout=0.5)
+        if audio_bytes is None:
+            continue
+        yield speech.StreamingRecognizeRequest(audio_content=audio_bytes)
 
 
 def transcribe_worker():
-    """Worker thread that processes audio chunks and transcribes them"""
+    """Worker thread that streams audio to Google Speech-to-Text and saves the transcripts"""
     global is_recording
 
-    if not SR_AVAILABLE:
+    if not SPEECH_AVAILABLE:
         print("Speech recognition not available!")
         return
 
-    recognizer = sr.Recognizer()
+    client = speech.SpeechClient()
+    streaming_config = speech.StreamingRecognitionConfig(
+        config=speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=SAMPLE_RATE,
+            language_code="en-US"
+        ),
+        interim_results=True
+    )
     session_file = OUTPUT_DIR / f"transcript_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
 
     print(f"\nTranscript will be saved to: {session_file}")
 
-    with open(session_file, 'w') as f:
-        f.write(f"Recording Session: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 60 + "\n\n")
+    # Opened once for the whole session; line-buffered so each entry reaches disk as it's written
+    transcript_fp = open(session_file, 'w', buffering=1)
+    transcript_fp.write(f"Recording Session: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    transcript_fp.write("=" * 60 + "\n\n")
 
-    audio_chunks = []
     chunk_counter = 0
 
-    while is_recording or not audio_queue.empty():
+    # One stream per STREAM_LIMIT seconds; results arrive while audio is still being sent
+    while is_recording or audio_blocks:
+        requests = audio_requests(time.monotonic() + STREAM_LIMIT)
         try:
-            # Collect audio chunks for processing
-            chunk = audio_queue.get(timeout=1)
-            audio_chunks.append(chunk)
-
-            # Process every few seconds
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
-                chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks)
-                audio_chunks = []
-
-                # Convert to int16 for speech recognition
-                audio_int16 = (audio_data * 32767).astype(np.int16)
-                audio_bytes = audio_int16.tobytes()
-
-                # Create AudioData object for speech recognition
-                audio_segment = sr.AudioData(audio_bytes, SAMPLE_RATE, 2)
-
-                try:
-                    # Transcribe using Google Speech Recognition (free, no API key needed)
-                    print(f"\n[Chunk {chunk_counter}] Transcribing...", end=" ")
-                    text = recognizer.recognize_google(audio_segment)
-
+            for response in client.streaming_recognize(streaming_config, requests):
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    text = result.alternatives[0].transcript.strip()
+
+                    if not result.is_final:
+                        # Interim hypothesis - show it, overwrite it when the final arrives
+                        print(f"\r... {text}", end="", flush=True)
+                        continue
+
+                    chunk_counter += 1
                     timestamp = datetime.now().strftime('%H:%M:%S')
-                    print(f"✓")
-                    print(f"[{timestamp}] {text}")
+                    print(f"\r[{timestamp}] {text}")
 
                     # Write to file
-                    with open(session_file, 'a') as f:
-                        f.write(f"[{timestamp}] {text}\n")
+                    transcript_fp.write(f"[{timestamp}] {text}\n")
 
                     # Also send to queue for further processing
                     transcript_queue.put({
@@ -120,18 +152,12 @@ def transcribe_worker():
                         'chunk': chunk_counter
                     })
 
-                except sr.UnknownValueError:
-                    print("✗ (unclear audio)")
-                except sr.RequestError as e:
-                    print(f"✗ Error: {e}")
-                except Exception as e:
-                    print(f"✗ Error: {e}")
-
-        except queue.Empty:
-            continue
         except KeyboardInterrupt:
             break
+        except Exception as e:
+            print(f"\n✗ Error: {e}")
 
+    transcript_fp.close()
     print(f"\nSession transcript saved to: {session_file}")
 
 
@@ -141,28 +167,21 @@ def save_audio_worker():
 
     audio_file = AUDIO_DIR / f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
 
-    all_audio = []
+    print(f"\nSaving audio recording to: {audio_file}")
+    # Save as WAV, appending each block as it arrives
+    with wave.open(str(audio_file), 'wb') as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(2)  # 16-bit
+        wf.setframerate(SAMPLE_RATE)
 
-    while is_recording:
-        try:
-            chunk = audio_queue.get(timeout=0.5)
-            all_audio.append(chunk)
-        except queue.Empty:
-            continue
+        while is_recording:
+            chunk = next_block(timeout=0.5)
+            if chunk is None:
+                continue
+            # Queued blocks are already int16 PCM
+            wf.writeframes(chunk)
 
-    if all_audio:
-        print(f"\nSaving audio recording to: {audio_file}")
-        audio_data = np.concatenate(all_audio)
-
-        # Save as WAV
-        with wave.open(str(audio_file), 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(2)  # 16-bit
-            wf.setframerate(SAMPLE_RATE)
-            audio_int16 = (audio_data * 32767).astype(np.int16)
-            wf.writeframes(audio_int16.tobytes())
-
-        print(f"Audio saved: {audio_file}")
+    print(f"Audio saved: {audio_file}")
 
 
 def main():
@@ -203,12 +222,13 @@ def main():
 
     try:
         # Start audio stream
-        with sd.InputStream(
+        with sd.RawInputStream(
             device=device_id,
             channels=CHANNELS,
             samplerate=SAMPLE_RATE,
+            dtype='int16',
             callback=audio_callback,
-            blocksize=1024
+            blocksize=BLOCK_SIZE
         ):
             # Keep recording until interrupted
             while is_recording:
@@ -225,6 +245,9 @@ def main():
     print("Finishing transcription...")
     transcribe_thread.join(timeout=10)
 
+    if dropped_samples:
+        print(f"\n⚠️  Dropped {dropped_samples / SAMPLE_RATE:.1f}s of audio - transcription fell too far behind")
+
     print("\n" + "=" * 60)
     print("  Recording session completed!")
     print(f"  Transcripts saved in: {OUTPUT_DIR}/")
@@ -232,9 +255,10 @@ def main():
 
 
 if __name__ == "__main__":
-    if not SR_AVAILABLE:
-        print("\nERROR: SpeechRecognition not installed!")
-        print("Install it with: pip install SpeechRecognition")
+    if not SPEECH_AVAILABLE:
+        print("\nERROR: google-cloud-speech not installed!")
+        print("Install it with: pip install google-cloud-speech")
+        print("Then point GOOGLE_APPLICATION_CREDENTIALS at a service account key")
         sys.exit(1)
 
     main()
\ No newline at end of file
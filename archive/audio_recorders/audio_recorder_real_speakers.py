@@ -6,17 +6,23 @@ Industry-standard AI model for speaker diarization - works automatically!
 
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
+import traceback
 from datetime import datetime
 from pathlib import Path
-import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import time
 import wave
-import ssl
+import threading
+import contextlib
 import tempfile
 import os
+import signal
 from dotenv import load_dotenv
 import warnings
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Load environment variables from .env file
 load_dotenv()
@@ -25,12 +31,11 @@ load_dotenv()
 warnings.filterwarnings('ignore', message='.*torchcodec.*')
 warnings.filterwarnings('ignore', category=UserWarning, module='pyannote.audio.core.io')
 
-# Fix SSL
-ssl._create_default_https_context = ssl._create_unverified_context
-
 # Imports
 try:
-    import whisper
+    from faster_whisper import WhisperModel, BatchedInferencePipeline, download_model
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    import ctranslate2
     WHISPER_AVAILABLE = True
 except ImportError:
     WHISPER_AVAILABLE = False
@@ -42,18 +47,47 @@ try:
 except ImportError:
     PYANNOTE_AVAILABLE = False
 
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
 # Configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK_DURATION = 10  # Longer chunks for better speaker detection
+WHISPER_BATCH = 4  # Max backlogged chunks decoded in one batched Whisper pass
+MAX_SESSION_SECONDS = 2 * 60 * 60  # Preallocated session buffer (oldest audio is overwritten after this)
+CHUNK_SAMPLES = CHUNK_DURATION * SAMPLE_RATE
+SESSION_SAMPLES = MAX_SESSION_SECONDS * SAMPLE_RATE
+INT16_SCALE = np.float32(1 / 32768)
+# pyannote defaults to 32, which thrashes VRAM on consumer GPUs; raise on bigger cards
+PYANNOTE_EMB_BATCH = int(os.getenv("PYANNOTE_EMB_BATCH", "8"))
+PYANNOTE_SEG_BATCH = int(os.getenv("PYANNOTE_SEG_BATCH", "8"))
+SESSION_FLUSH_EVERY = 8  # Transcript entries between flushes of the session file
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
+EMBEDDING_TRUNK_ONNX = Path("models") / "wespeaker_trunk_int8.onnx"  # Exported on first CPU run
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-audio_queue = queue.Queue()
+# Session audio lives in one preallocated single-producer/single-consumer ring
+# of int16 PCM (what the WAV needs anyway - half the memory of float32).
+# The ring is a shared-memory block: the recording process writes it from the
+# audio callback, the transcription worker process reads it.
+# Cursors are absolute sample counts: only the audio callback advances w_idx,
+# only the transcription worker advances r_idx, so neither side needs a lock.
+session_audio = None  # Attached to shared memory by main() and by the worker
+callback_scratch = np.empty(SAMPLE_RATE, dtype=np.float32)
+w_idx = multiprocessing.Value('q', 0, lock=False)
+r_idx = multiprocessing.Value('q', 0, lock=False)
+dropped_samples = 0
 is_recording = True
+stop_recording = None  # multiprocessing.Event shared with the worker
+models_ready = None  # multiprocessing.Event, set once models are loaded and warmed up
 
 
 def list_audio_devices():
@@ -69,23 +103,269 @@ def list_audio_devices():
 
 def audio_callback(indata, frames, time, status):
     """Callback for audio stream"""
+    global dropped_samples
     if status:
         print(f"Audio status: {status}", file=sys.stderr)
-    audio_queue.put(indata.copy())
+
+    write_pos = w_idx.value
+    # Never lap audio the transcribe thread hasn't read yet
+    if write_pos + frames - r_idx.value > SESSION_SAMPLES:
+        dropped_samples += frames
+        return
+
+    # Quantize on arrival, in place in a preallocated scratch block
+    block = np.multiply(indata[:, 0], 32767, out=callback_scratch[:frames])
+    np.clip(block, -32768, 32767, out=block)
+
+    start = write_pos % SESSION_SAMPLES
+    end = start + frames
+    if end <= SESSION_SAMPLES:
+        session_audio[start:end] = block
+    else:
+        split = SESSION_SAMPLES - start
+        session_audio[start:] = block[:split]
+        session_audio[:end - SESSION_SAMPLES] = block[split:]
+    w_idx.value = write_pos + frames
+
+
+def attach_session_audio(shm):
+    """Point the ring at a shared-memory block"""
+    global session_audio
+    session_audio = np.ndarray((SESSION_SAMPLES,), dtype=np.int16, buffer=shm.buf)
+
+
+def read_ring(start, length, scratch):
+    """Return `length` samples from absolute position `start` (a view unless it wraps)"""
+    offset = start % SESSION_SAMPLES
+    end = offset + length
+    if end <= SESSION_SAMPLES:
+        return session_audio[offset:end]
+
+    split = SESSION_SAMPLES - offset
+    scratch[:split] = session_audio[offset:]
+    scratch[split:length] = session_audio[:end - SESSION_SAMPLES]
+    return scratch[:length]
+
+
+def read_float(start, out):
+    """Dequantize len(out) samples from absolute position `start` into float32 `out`"""
+    length = len(out)
+    offset = start % SESSION_SAMPLES
+    split = min(length, SESSION_SAMPLES - offset)
+    np.multiply(session_audio[offset:offset + split], INT16_SCALE, out=out[:split])
+    np.multiply(session_audio[:length - split], INT16_SCALE, out=out[split:])
+    return out
+
+
+def ensure_models(names):
+    """
+    Pre-fetch Whisper weights into the Hugging Face cache so the first session doesn't stall on the download
+    Downloads use normal certificate verification; on failure load_whisper falls back to fetching lazily
+    """
+    for name in names:
+        with contextlib.suppress(Exception):
+            download_model(name)
+
+
+def load_whisper(model_name):
+    """Load a CTranslate2 Whisper model - int8 on CPU, int8 weights with fp16 compute on CUDA"""
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_name, device="cuda", compute_type="int8_float16")
+    return WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=os.cpu_count())
+
+
+def speech_bounds(audio):
+    """Sample range spanning all detected speech in `audio`, or None if the chunk is silent"""
+    timestamps = get_speech_timestamps(audio, VadOptions())
+    if not timestamps:
+        return None
+    return timestamps[0]["start"], timestamps[-1]["end"]
+
+
+def transcribe_batch(model, chunks):
+    """Transcribe equal-length chunks, batching the Whisper decode when there are several"""
+    if len(chunks) == 1:
+        segments, _ = model.transcribe(chunks[0], language="en", beam_size=1, vad_filter=True)
+        return ["".join(segment.text for segment in segments).strip()]
+
+    # Lay the backlog end to end; the batched pipeline splits it on speech
+    # boundaries and encodes those segments together. Each segment is then
+    # credited to the chunk it starts in.
+    texts = [[] for _ in chunks]
+    segments, _ = BatchedInferencePipeline(model=model).transcribe(
+        np.concatenate(chunks), language="en", batch_size=WHISPER_BATCH
+    )
+    for segment in segments:
+        idx = min(int(segment.start // CHUNK_DURATION), len(chunks) - 1)
+        texts[idx].append(segment.text)
+    return ["".join(parts).strip() for parts in texts]
+
+
+def embedding_trunk(resnet, fbank):
+    """WeSpeaker ResNet conv trunk: fbank features -> feature maps ahead of pooling"""
+    out = fbank.permute(0, 2, 1).unsqueeze(1)
+    out = torch.relu(resnet.bn1(resnet.conv1(out)))
+    return resnet.layer4(resnet.layer3(resnet.layer2(resnet.layer1(out))))
+
+
+def quantize_embedding_trunk(pipeline, path=EMBEDDING_TRUNK_ONNX):
+    """
+    Run the embedding trunk as an int8 ONNX Runtime model on CPU
+
+    The ResNet trunk is where diarization spends its time on CPU. It is
+    exported to ONNX and dynamically quantized once, then cached at `path`.
+    Returns a drop-in replacement for embedding_trunk(resnet, fbank).
+    """
+    model = pipeline._embedding.model_
+    resnet = model.resnet
+
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fp32_path = path.with_suffix(".fp32.onnx")
+
+        class Trunk(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.resnet = resnet
+
+            def forward(self, fbank):
+                return embedding_trunk(self.resnet, fbank)
+
+        with torch.no_grad():
+            dummy = model.compute_fbank(torch.zeros(1, 1, CHUNK_SAMPLES))
+            torch.onnx.export(
+                Trunk().eval(), dummy, str(fp32_path),
+                input_names=["fbank"], output_names=["features"],
+                dynamic_axes={"fbank": {0: "batch", 1: "frames"}, "features": {0: "batch", 3: "frames"}},
+                opset_version=17
+            )
+        quantize_dynamic(str(fp32_path), str(path), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+
+    session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+
+    def trunk(resnet, fbank):
+        features = session.run(None, {"fbank": fbank.detach().cpu().numpy()})[0]
+        return torch.from_numpy(features)
+
+    return trunk
+
+
+def share_embedding_backbone(pipeline, trunk=embedding_trunk):
+    """
+    Run the WeSpeaker ResNet trunk once per audio window instead of once per (window, speaker)
+
+    pyannote embeds every local speaker of a window separately, feeding the same
+    waveform back to back with only the pooling weights changing. The conv trunk
+    doesn't depend on those weights, so compute it for distinct windows and only
+    redo the masked statistics pooling + projection per speaker.
+    """
+    model = getattr(pipeline._embedding, "model_", None)
+    resnet = getattr(model, "resnet", None)
+    if not hasattr(model, "compute_fbank") or not hasattr(resnet, "pool"):
+        return False
+
+    last = {}  # Final window of the previous batch, which may continue into this one
+
+    def head(features, weights):
+        embed = resnet.seg_1(resnet.pool(features, weights=weights))
+        if resnet.two_emb_layer:
+            embed = resnet.seg_2(resnet.seg_bn_1(torch.relu(embed)))
+        return embed
+
+    def forward(waveforms, weights=None):
+        new = torch.ones(len(waveforms), dtype=torch.bool, device=waveforms.device)
+        new[1:] = (waveforms[1:] != waveforms[:-1]).flatten(1).any(dim=1)
+        prev = last.get("waveform")
+        carried = prev is not None and prev.shape == waveforms[0].shape and torch.equal(prev, waveforms[0])
+        new[0] = not carried
+
+        features = trunk(resnet, model.compute_fbank(waveforms[new])) if new.any() else None
+        if carried:
+            features = last["features"] if features is None else torch.cat([last["features"], features])
+        features = features[torch.cumsum(new, 0) - 1 + int(carried)]
+
+        last["waveform"], last["features"] = waveforms[-1], features[-1:]
+        return head(features, weights)
+
+    model.forward = forward
+    return True
+
+
+def compile_diarization(pipeline, embedding=True):
+    """torch.compile the segmentation and (optionally) embedding networks behind the pipeline"""
+    # CUDA graphs ("reduce-overhead") only pay off on GPU; the default mode still fuses kernels on CPU
+    mode = "reduce-overhead" if torch.cuda.is_available() else "default"
+    targets = [(pipeline._segmentation, "model")]
+    if embedding:
+        targets.append((pipeline._embedding, "model_"))
+    for owner, attr in targets:
+        module = getattr(owner, attr, None)
+        if isinstance(module, torch.nn.Module):
+            setattr(owner, attr, torch.compile(module, mode=mode, fullgraph=False))
+
+
+def warm_up_models(model, diarization_pipeline=None):
+    """Run each model once on dummy audio so lazy init/compilation doesn't land on the first real chunk"""
+    dummy = np.zeros(CHUNK_SAMPLES, dtype=np.float32)
+    speech_bounds(dummy)
+    # No VAD filter here, otherwise silence never reaches the encoder
+    segments, _ = model.transcribe(dummy, language="en", beam_size=1)
+    list(segments)
+
+    if diarization_pipeline:
+        # pyannote can reject pure silence - fall back to faint noise
+        for waveform in (torch.zeros(1, CHUNK_SAMPLES), torch.randn(1, CHUNK_SAMPLES) * 0.01):
+            try:
+                with torch.inference_mode():
+                    diarization_pipeline({"waveform": waveform, "sample_rate": SAMPLE_RATE})
+                break
+            except Exception:
+                continue
+
+
+def dominant_speaker(diarization_pipeline, waveform, stream=None):
+    """Diarize one chunk and return the label of whoever speaks longest in it"""
+    # Queue pyannote's kernels on the given CUDA stream (a no-op with None)
+    with torch.inference_mode(), torch.cuda.stream(stream):
+        diarization = diarization_pipeline({"waveform": waveform, "sample_rate": SAMPLE_RATE})
+
+    # Find most dominant speaker in this chunk, tracking
+    # the leader while accumulating instead of a second pass
+    speaker_label = "Unknown"
+    speaker_times = defaultdict(float)
+    best_time = 0
+
+    # Check if diarization has segments
+    if hasattr(diarization, 'labels'):
+        # New API: iterate through timeline
+        for segment, _, label in diarization.itertracks(yield_label=True):
+            speaker_times[label] += segment.end - segment.start
+            if speaker_times[label] > best_time:
+                best_time = speaker_times[label]
+                speaker_label = label
+    elif hasattr(diarization, '__iter__'):
+        # Try iterating directly
+        for item in diarization:
+            if hasattr(item, 'label'):
+                speaker_times[item.label] += 1
+                if speaker_times[item.label] > best_time:
+                    best_time = speaker_times[item.label]
+                    speaker_label = item.label
+    return speaker_label
 
 
 def transcribe_with_real_diarization(model_name="base", use_hf_token=None):
     """
     Transcribe with pyannote.audio speaker diarization
     """
-    global is_recording
-
     print(f"\nLoading Whisper model '{model_name}'...")
-    model = whisper.load_model(model_name)
+    model = load_whisper(model_name)
     print("✓ Whisper loaded")
 
     # Try to load pyannote pipeline
     diarization_pipeline = None
+    staging = None  # Pinned host buffer + persistent device buffer for async chunk uploads
     if PYANNOTE_AVAILABLE:
         try:
             print("\nLoading speaker diarization model...")
@@ -96,8 +376,38 @@ def transcribe_with_real_diarization(model_name="base", use_hf_token=None):
                 "pyannote/speaker-diarization-3.1",
                 token=use_hf_token if use_hf_token else True
             )
+            diarization_pipeline.embedding_batch_size = PYANNOTE_EMB_BATCH
+            diarization_pipeline.segmentation_batch_size = PYANNOTE_SEG_BATCH
+
+            if torch.cuda.is_available():
+                diarization_pipeline.to(torch.device("cuda"))
+                staging = {
+                    "pinned": torch.empty((1, CHUNK_SAMPLES), dtype=torch.float32, pin_memory=True),
+                    "device": torch.empty((1, CHUNK_SAMPLES), dtype=torch.float32, device="cuda"),
+                    "stream": torch.cuda.Stream(),
+                }
 
             print("✓ Speaker diarization loaded")
+
+            trunk = embedding_trunk
+            if ONNXRUNTIME_AVAILABLE and not torch.cuda.is_available():
+                try:
+                    trunk = quantize_embedding_trunk(diarization_pipeline)
+                    print("✓ Speaker embedding trunk running int8 on ONNX Runtime")
+                except Exception as e:
+                    print(f"⚠️  int8 embedding unavailable, using PyTorch: {e}")
+
+            if share_embedding_backbone(diarization_pipeline, trunk):
+                print("✓ Speaker embeddings share one ResNet pass per window")
+            else:
+                trunk = embedding_trunk  # The ONNX trunk only runs behind the shared backbone
+
+            try:
+                # Compilation happens on the first call, i.e. during warm-up below
+                compile_diarization(diarization_pipeline, embedding=trunk is embedding_trunk)
+                print("✓ Diarization models compiled")
+            except Exception as e:
+                print(f"⚠️  torch.compile unavailable, running eagerly: {e}")
         except Exception as e:
             print(f"\n⚠️  Could not load diarization model: {e}")
             print("Will proceed without speaker detection")
@@ -106,26 +416,36 @@ def transcribe_with_real_diarization(model_name="base", use_hf_token=None):
             print("2. Accept license at https://huggingface.co/pyannote/speaker-diarization-3.1")
             print("3. Run again with: export HF_TOKEN=your_token")
 
+    print("\nWarming up models...")
+    warm_up_models(model, diarization_pipeline)
+    print("✓ Models ready")
+    models_ready.set()
+
     session_file = OUTPUT_DIR / f"transcript_real_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
     audio_file = AUDIO_DIR / f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
 
     print(f"\n📝 Transcript: {session_file}")
     print(f"🎵 Audio: {audio_file}")
 
-    with open(session_file, 'w') as f:
-        f.write(f"Recording Session with Real Speaker Diarization\n")
-        f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: Whisper {model_name}")
-        if diarization_pipeline:
-            f.write(f" + pyannote.audio diarization\n")
-        else:
-            f.write(f" (no speaker detection)\n")
-        f.write("=" * 70 + "\n\n")
+    # One buffered handle for the whole session instead of reopening it per chunk
+    session_fp = open(session_file, 'w', buffering=1 << 16)
+    session_fp.write(f"Recording Session with Real Speaker Diarization\n")
+    session_fp.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    session_fp.write(f"Model: Whisper {model_name}")
+    if diarization_pipeline:
+        session_fp.write(f" + pyannote.audio diarization\n")
+    else:
+        session_fp.write(f" (no speaker detection)\n")
+    session_fp.write("=" * 70 + "\n\n")
 
-    audio_chunks = []
-    all_audio = []
+    chunk_scratch = np.empty((WHISPER_BATCH, CHUNK_SAMPLES), dtype=np.float32)
+    decoded = {}  # Chunk start sample -> text, for chunks decoded ahead in a batch
     chunk_counter = 0
+    entries_written = 0
     speaker_stats = {}
+    # Diarization runs on this thread while Whisper decodes on the loop thread;
+    # both ctranslate2 and torch release the GIL in their kernels
+    diarizer = ThreadPoolExecutor(max_workers=1)
 
     print("\n" + "=" * 70)
     if diarization_pipeline:
@@ -135,67 +455,63 @@ def transcribe_with_real_diarization(model_name="base", use_hf_token=None):
         print("  Recording without speaker detection")
     print("=" * 70 + "\n")
 
-    while is_recording or not audio_queue.empty():
+    while not stop_recording.is_set() or w_idx.value - r_idx.value >= CHUNK_SAMPLES:
         try:
-            chunk = audio_queue.get(timeout=1)
-            audio_chunks.append(chunk)
-            all_audio.append(chunk)
-
             # Process every CHUNK_DURATION seconds
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
+            if w_idx.value - r_idx.value >= CHUNK_SAMPLES:
                 chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks).flatten()
-                audio_chunks = []
+                chunk_start = r_idx.value
+                audio_float = read_float(chunk_start, chunk_scratch[0])
+                r_idx.value = chunk_start + CHUNK_SAMPLES
 
                 print(f"\n[Chunk {chunk_counter}] Processing...", end=" ")
 
+                # Silero VAD gate - silent chunks skip Whisper and speaker detection entirely
+                bounds = speech_bounds(audio_float)
+                if bounds is None:
+                    decoded.pop(chunk_start, None)
+                    print("✗ (silence)")
+                    continue
+
+                diarize = None
+                if diarization_pipeline:
+                    if staging:
+                        # Upload on the side stream; diarization is queued behind it on the same stream
+                        staging["stream"].synchronize()
+                        staging["pinned"][0].copy_(torch.from_numpy(audio_float))
+                        with torch.cuda.stream(staging["stream"]):
+                            staging["device"].copy_(staging["pinned"], non_blocking=True)
+                        waveform = staging["device"]
+                    else:
+                        waveform = torch.from_numpy(audio_float).unsqueeze(0)  # Add channel dimension
+                    diarize = diarizer.submit(
+                        dominant_speaker, diarization_pipeline, waveform,
+                        staging["stream"] if staging else None
+                    )
+
                 try:
-                    # Transcribe first
-                    audio_float = audio_data.astype(np.float32)
-                    result = model.transcribe(audio_float, language="en", fp16=False)
-                    text = result["text"].strip()
+                    # Transcribe first - if chunks have backed up behind this one,
+                    # decode them in the same Whisper batch and reuse the text later
+                    if chunk_start not in decoded:
+                        backlog = min(WHISPER_BATCH - 1, (w_idx.value - r_idx.value) // CHUNK_SAMPLES)
+                        starts = [chunk_start + i * CHUNK_SAMPLES for i in range(backlog + 1)]
+                        batch = [audio_float] + [
+                            read_float(start, chunk_scratch[i])
+                            for i, start in enumerate(starts[1:], 1)
+                        ]
+                        if len(batch) == 1:
+                            # Nothing queued behind - only hand Whisper the span with speech
+                            batch[0] = audio_float[bounds[0]:bounds[1]]
+                        decoded.update(zip(starts, transcribe_batch(model, batch)))
+                    text = decoded.pop(chunk_start)
 
                     if text:
                         # Determine speaker if diarization available
                         speaker_label = "Unknown"
 
-                        if diarization_pipeline:
+                        if diarize:
                             try:
-                                # Convert audio to torch tensor format pyannote expects
-                                import torch
-
-                                # Create waveform dict that pyannote can use directly
-                                waveform = torch.from_numpy(audio_float).unsqueeze(0)  # Add channel dimension
-
-                                # Create the audio input dict
-                                audio_input = {
-                                    "waveform": waveform,
-                                    "sample_rate": SAMPLE_RATE
-                                }
-
-                                # Run diarization on the audio data directly
-                                diarization = diarization_pipeline(audio_input)
-
-                                # Get speaker for this audio
-                                # Find most dominant speaker in this chunk
-                                speaker_times = {}
-
-                                # Check if diarization has segments
-                                if hasattr(diarization, 'labels'):
-                                    # New API: iterate through timeline
-                                    for segment, _, label in diarization.itertracks(yield_label=True):
-                                        duration = segment.end - segment.start
-                                        speaker_times[label] = speaker_times.get(label, 0) + duration
-                                elif hasattr(diarization, '__iter__'):
-                                    # Try iterating directly
-                                    for item in diarization:
-                                        if hasattr(item, 'label'):
-                                            speaker_times[item.label] = speaker_times.get(item.label, 0) + 1
-
-                                if speaker_times:
-                                    # Get speaker with most speaking time
-                                    dominant_speaker = max(speaker_times, key=speaker_times.get)
-                                    speaker_label = dominant_speaker
+                                speaker_label = diarize.result()
                             except Exception as diar_error:
                                 # If diarization fails, just continue without it
                                 print(f" (diarization failed: {diar_error})")
@@ -208,39 +524,49 @@ def transcribe_with_real_diarization(model_name="base", use_hf_token=None):
                         print(f"[{speaker_label}] [{timestamp}] {text}")
 
                         # Write to file
-                        with open(session_file, 'a') as f:
-                            f.write(f"[{speaker_label}] [{timestamp}]\n")
-                            f.write(f"{text}\n\n")
+                        session_fp.write(f"[{speaker_label}] [{timestamp}]\n")
+                        session_fp.write(f"{text}\n\n")
+                        entries_written += 1
+                        if entries_written % SESSION_FLUSH_EVERY == 0:
+                            session_fp.flush()
                     else:
                         print("✗ (silence)")
 
                 except Exception as e:
                     print(f"✗ Error: {e}")
-                    import traceback
                     traceback.print_exc()
+                finally:
+                    if diarize:
+                        # The next chunk reuses the buffers this diarization reads
+                        wait([diarize])
+
+            else:
+                time.sleep(0.1)
 
-        except queue.Empty:
-            continue
         except KeyboardInterrupt:
             break
 
+    diarizer.shutdown()
+
     # Save audio file
-    if all_audio:
+    total_samples = w_idx.value
+    if total_samples:
         print(f"\n💾 Saving audio...")
-        audio_data = np.concatenate(all_audio).flatten()
-        audio_int16 = (audio_data * 32767).astype(np.int16)
+        block_scratch = np.empty(SAMPLE_RATE, dtype=np.int16)
 
         with wave.open(str(audio_file), 'wb') as wf:
             wf.setnchannels(CHANNELS)
             wf.setsampwidth(2)
             wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(audio_int16.tobytes())
+            # The ring already holds int16 PCM - stream it out in 1-second blocks
+            for start in range(max(0, total_samples - SESSION_SAMPLES), total_samples, SAMPLE_RATE):
+                wf.writeframes(read_ring(start, min(SAMPLE_RATE, total_samples - start), block_scratch))
 
         print(f"✓ Audio saved")
 
     # Session summary
     print(f"\n📊 Session Summary:")
-    with open(session_file, 'a') as f:
+    with session_fp as f:
         f.write("\n" + "=" * 70 + "\n")
         f.write("SESSION SUMMARY\n")
         f.write("=" * 70 + "\n\n")
@@ -255,8 +581,30 @@ def transcribe_with_real_diarization(model_name="base", use_hf_token=None):
     print(f"\n✓ Transcript saved: {session_file}")
 
 
+def transcription_worker(shm_name, write_cursor, read_cursor, stop, ready, model_name, hf_token):
+    """
+    Worker process entry point: owns Whisper and pyannote
+
+    Running the models in their own process (and GIL) keeps their Python-side
+    work from starving the audio callback in the recording process.
+    """
+    global session_audio, w_idx, r_idx, stop_recording, models_ready
+    # The worker shares the terminal's process group - ignore the Ctrl+C that
+    # stops recording, so the backlog, WAV and summary still get written.
+    # It stops only through stop_recording
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    attach_session_audio(shm)
+    w_idx, r_idx, stop_recording, models_ready = write_cursor, read_cursor, stop, ready
+    try:
+        transcribe_with_real_diarization(model_name, hf_token)
+    finally:
+        session_audio = None
+        shm.close()
+
+
 def main():
-    global is_recording
+    global is_recording, session_audio, stop_recording, models_ready
 
     print("=" * 70)
     print("  Real Speaker Detection with pyannote.audio")
@@ -265,9 +613,12 @@ def main():
 
     if not WHISPER_AVAILABLE:
         print("\nERROR: Whisper not installed!")
-        print("Install with: pip install openai-whisper")
+        print("Install with: pip install faster-whisper")
         sys.exit(1)
 
+    # Fetch the offered model sizes while the device/model prompts are up
+    threading.Thread(target=ensure_models, args=(("tiny", "base"),), daemon=True).start()
+
     if not PYANNOTE_AVAILABLE:
         print("\n⚠️  pyannote.audio not installed!")
         print("Install with: pip install pyannote.audio")
@@ -275,7 +626,6 @@ def main():
 
     # Check for HF token
     hf_token = None
-    import os
     if 'HF_TOKEN' in os.environ:
         hf_token = os.environ['HF_TOKEN']
         print("✓ Found Hugging Face token in environment")
@@ -307,34 +657,54 @@ def main():
     model_choice = input("Select (1/2) [default: 2]: ").strip()
     model_name = "tiny" if model_choice == "1" else "base"
 
-    # Start transcription
-    transcribe_thread = threading.Thread(
-        target=transcribe_with_real_diarization,
-        args=(model_name, hf_token),
+    # Start transcription in a worker process (spawn: CUDA doesn't survive fork)
+    shm = shared_memory.SharedMemory(create=True, size=SESSION_SAMPLES * np.dtype(np.int16).itemsize)
+    attach_session_audio(shm)
+    ctx = multiprocessing.get_context("spawn")
+    stop_recording = ctx.Event()
+    models_ready = ctx.Event()
+    worker = ctx.Process(
+        target=transcription_worker,
+        args=(shm.name, w_idx, r_idx, stop_recording, models_ready, model_name, hf_token),
         daemon=True
     )
-    transcribe_thread.start()
+    worker.start()
 
     try:
-        with sd.InputStream(
-            device=device_id,
-            channels=CHANNELS,
-            samplerate=SAMPLE_RATE,
-            callback=audio_callback,
-            blocksize=1024
-        ):
-            while is_recording:
-                sd.sleep(1000)
-
-    except KeyboardInterrupt:
-        print("\n\nStopping recording...")
-        is_recording = False
-    except Exception as e:
-        print(f"\nError: {e}")
-        is_recording = False
-
-    print("\nFinishing transcription...")
-    transcribe_thread.join(timeout=20)
+        # Don't open the stream until the models are loaded and warmed up
+        while not models_ready.wait(timeout=1):
+            if not worker.is_alive():
+                sys.exit(1)
+
+        try:
+            with sd.InputStream(
+                device=device_id,
+                channels=CHANNELS,
+                samplerate=SAMPLE_RATE,
+                callback=audio_callback,
+                blocksize=1024
+            ):
+                while is_recording:
+                    sd.sleep(1000)
+
+        except KeyboardInterrupt:
+            print("\n\nStopping recording...")
+            is_recording = False
+        except Exception as e:
+            print(f"\nError: {e}")
+            is_recording = False
+
+        print("\nFinishing transcription...")
+        stop_recording.set()
+        # Wait for the backlog to drain - the shared memory must outlive the worker
+        worker.join()
+
+        if dropped_samples:
+            print(f"\n⚠️  Dropped {dropped_samples / SAMPLE_RATE:.1f}s of audio - transcription fell too far behind")
+    finally:
+        session_audio = None
+        shm.close()
+        shm.unlink()
 
     print("\n" + "=" * 70)
     print("  Recording completed!")
@@ -6,38 +6,65 @@ Uses audio features (pitch, energy, spectral features) to distinguish speakers
 
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
+import traceback
 from datetime import datetime
 from pathlib import Path
 import threading
+import contextlib
+import multiprocessing
+import time
 import wave
-import ssl
-from collections import deque
-
-# Fix SSL
-ssl._create_default_https_context = ssl._create_unverified_context
+import os
+from collections import deque, defaultdict
 
 # Imports
 try:
-    import whisper
+    from faster_whisper import WhisperModel, BatchedInferencePipeline, download_model
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    import ctranslate2
     WHISPER_AVAILABLE = True
 except ImportError:
     WHISPER_AVAILABLE = False
-    print("Whisper not available. Install with: pip install openai-whisper")
+    print("Whisper not available. Install with: pip install faster-whisper")
+
+# scipy's pocketfft can split one transform across cores; numpy's can't
+try:
+    from scipy.fft import rfft, irfft, next_fast_len
+    FFT_KWARGS = {"workers": -1}
+except ImportError:
+    from numpy.fft import rfft, irfft
+    next_fast_len = None
+    FFT_KWARGS = {}
 
 # Configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK_DURATION = 8  # Process every 8 seconds
+MAX_SPEAKERS = 10  # New voices past this are assigned to the closest known speaker
+WHISPER_BATCH = 4  # Max backlogged chunks decoded in one batched Whisper pass
+MAX_SESSION_SECONDS = 2 * 60 * 60  # Preallocated session buffer (oldest audio is overwritten after this)
+CHUNK_SAMPLES = CHUNK_DURATION * SAMPLE_RATE
+SESSION_SAMPLES = MAX_SESSION_SECONDS * SAMPLE_RATE
+INT16_SCALE = np.float32(1 / 32768)
+SESSION_FLUSH_EVERY = 8  # Transcript entries between flushes of the session file
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-audio_queue = queue.Queue()
+# Session audio lives in one preallocated single-producer/single-consumer ring
+# of int16 PCM (what the WAV needs anyway - half the memory of float32).
+# Cursors are absolute sample counts: only the audio callback advances w_idx,
+# only the transcribe thread advances r_idx, so neither side needs a lock.
+session_audio = np.empty(SESSION_SAMPLES, dtype=np.int16)
+callback_scratch = np.empty(SAMPLE_RATE, dtype=np.float32)
+w_idx = multiprocessing.Value('q', 0, lock=False)
+r_idx = multiprocessing.Value('q', 0, lock=False)
+dropped_samples = 0
 is_recording = True
+models_ready = threading.Event()  # Set once models are loaded and warmed up
 
 
 class SpeakerTracker:
@@ -46,18 +73,48 @@ class SpeakerTracker:
     Uses pitch and spectral centroid to distinguish voices
     """
     def __init__(self):
-        self.speaker_profiles = []  # List of (pitch_mean, spectral_mean) tuples
+        # (pitch_mean, spectral_mean) rows, filled in order of first appearance
+        self._profiles = np.empty((MAX_SPEAKERS, 2))
+        self._n_profiles = 0
         self.speaker_history = deque(maxlen=5)  # Last 5 speaker IDs
+        self._history_counts = defaultdict(int)  # Speaker ID -> count in history
+        self._mode = None  # Most common speaker in history
+
+        # FFT bins and scratch, sized on first use (chunk length is fixed per session)
+        self._n_fft = None
+        self._freqs = None
+        self._mag = None
+        self._power = None
+
+    @property
+    def speaker_profiles(self):
+        """(N, 2) view of the known speakers' (pitch, spectral) profiles"""
+        return self._profiles[:self._n_profiles]
+
+    def _prepare_fft(self, n_fft):
+        """(Re)allocate the frequency bins and scratch arrays for an FFT length"""
+        if self._n_fft != n_fft:
+            self._n_fft = n_fft
+            self._freqs = np.fft.rfftfreq(n_fft, 1/SAMPLE_RATE)
+            self._mag = np.empty(n_fft // 2 + 1)
+            self._power = np.empty(n_fft // 2 + 1)
 
     def extract_features(self, audio_data):
         """Extract pitch and spectral features from audio"""
         if len(audio_data) == 0:
             return None, None
 
+        # One zero-padded FFT feeds both features; padding to >= 2N keeps the
+        # circular autocorrelation from wrapping around
+        n = len(audio_data)
+        n_fft = next_fast_len(2 * n - 1, real=True) if next_fast_len else 1 << (2 * n - 1).bit_length()
+        self._prepare_fft(n_fft)
+        magnitude = np.abs(rfft(audio_data, n=n_fft, **FFT_KWARGS), out=self._mag)
+
         # Calculate pitch (fundamental frequency) using autocorrelation
         # Higher pitch typically = different speaker
-        autocorr = np.correlate(audio_data, audio_data, mode='full')
-        autocorr = autocorr[len(autocorr)//2:]
+        # Wiener-Khinchin: autocorrelation = inverse FFT of the power spectrum
+        autocorr = irfft(np.square(magnitude, out=self._power), n=n_fft, **FFT_KWARGS)[:n]
 
         # Find peaks in autocorrelation
         if len(autocorr) > 100:
@@ -79,12 +136,9 @@ class SpeakerTracker:
 
         # Calculate spectral centroid (brightness of sound)
         # Different speakers have different spectral characteristics
-        fft = np.fft.rfft(audio_data)
-        magnitude = np.abs(fft)
-        freqs = np.fft.rfftfreq(len(audio_data), 1/SAMPLE_RATE)
-
-        if np.sum(magnitude) > 0:
-            spectral_centroid = np.sum(freqs * magnitude) / np.sum(magnitude)
+        total_magnitude = magnitude.sum()
+        if total_magnitude > 0:
+            spectral_centroid = np.dot(self._freqs, magnitude) / total_magnitude
         else:
             spectral_centroid = 1000
 
@@ -108,17 +162,12 @@ class SpeakerTracker:
         best_match = None
         best_distance = float('inf')
 
-        for idx, (stored_pitch, stored_spectral) in enumerate(self.speaker_profiles):
-            # Calculate distance in feature space
-            pitch_diff = abs(pitch - stored_pitch)
-            spectral_diff = abs(spectral - stored_spectral)
-
-            # Weighted distance - pitch is more reliable
-            distance = (pitch_diff * 2) + (spectral_diff / 10)
-
-            if distance < best_distance:
-                best_distance = distance
-                best_match = idx
+        profiles = self.speaker_profiles
+        if len(profiles):
+            # Weighted distance to every profile at once - pitch is more reliable
+            distances = np.abs(profiles[:, 0] - pitch) * 2 + np.abs(profiles[:, 1] - spectral) / 10
+            best_match = int(distances.argmin())
+            best_distance = float(distances[best_match])
 
         # If close match found, return that speaker
         if best_match is not None and best_distance < match_threshold:
@@ -126,22 +175,32 @@ class SpeakerTracker:
         else:
             # Only create new speaker if REALLY different
             # AND we don't have too many already
-            if len(self.speaker_profiles) < 10:  # Cap at 10 speakers max
-                self.speaker_profiles.append((pitch, spectral))
-                speaker_id = len(self.speaker_profiles)
+            if self._n_profiles < MAX_SPEAKERS:
+                self._profiles[self._n_profiles] = (pitch, spectral)
+                self._n_profiles += 1
+                speaker_id = self._n_profiles
             else:
                 # Too many speakers, just use closest match
                 speaker_id = best_match + 1 if best_match is not None else 1
 
-        # Track speaker history for smoothing
+        # Track speaker history for smoothing, keeping the counts incrementally
+        counts = self._history_counts
+        evicted = None
+        if len(self.speaker_history) == self.speaker_history.maxlen:
+            evicted = self.speaker_history[0]
+            counts[evicted] -= 1
         self.speaker_history.append(speaker_id)
+        counts[speaker_id] += 1
+
+        if evicted is not None and evicted == self._mode and evicted != speaker_id:
+            # The mode lost a vote - rescan the (at most MAX_SPEAKERS) speaker counts
+            self._mode = max(counts, key=counts.get)
+        elif self._mode is None or counts[speaker_id] > counts[self._mode]:
+            self._mode = speaker_id
 
         # Use most common speaker in recent history (smoothing)
         if len(self.speaker_history) >= 3:
-            from collections import Counter
-            counter = Counter(self.speaker_history)
-            most_common = counter.most_common(1)[0][0]
-            return most_common
+            return self._mode
 
         return speaker_id
 
@@ -173,9 +232,105 @@ def list_audio_devices():
 
 def audio_callback(indata, frames, time, status):
     """Callback for audio stream"""
+    global dropped_samples
     if status:
         print(f"Audio status: {status}", file=sys.stderr)
-    audio_queue.put(indata.copy())
+
+    write_pos = w_idx.value
+    # Never lap audio the transcribe thread hasn't read yet
+    if write_pos + frames - r_idx.value > SESSION_SAMPLES:
+        dropped_samples += frames
+        return
+
+    # Quantize on arrival, in place in a preallocated scratch block
+    block = np.multiply(indata[:, 0], 32767, out=callback_scratch[:frames])
+    np.clip(block, -32768, 32767, out=block)
+
+    start = write_pos % SESSION_SAMPLES
+    end = start + frames
+    if end <= SESSION_SAMPLES:
+        session_audio[start:end] = block
+    else:
+        split = SESSION_SAMPLES - start
+        session_audio[start:] = block[:split]
+        session_audio[:end - SESSION_SAMPLES] = block[split:]
+    w_idx.value = write_pos + frames
+
+
+def read_ring(start, length, scratch):
+    """Return `length` samples from absolute position `start` (a view unless it wraps)"""
+    offset = start % SESSION_SAMPLES
+    end = offset + length
+    if end <= SESSION_SAMPLES:
+        return session_audio[offset:end]
+
+    split = SESSION_SAMPLES - offset
+    scratch[:split] = session_audio[offset:]
+    scratch[split:length] = session_audio[:end - SESSION_SAMPLES]
+    return scratch[:length]
+
+
+def read_float(start, out):
+    """Dequantize len(out) samples from absolute position `start` into float32 `out`"""
+    length = len(out)
+    offset = start % SESSION_SAMPLES
+    split = min(length, SESSION_SAMPLES - offset)
+    np.multiply(session_audio[offset:offset + split], INT16_SCALE, out=out[:split])
+    np.multiply(session_audio[:length - split], INT16_SCALE, out=out[split:])
+    return out
+
+
+def ensure_models(names):
+    """
+    Pre-fetch Whisper weights into the Hugging Face cache so the first session doesn't stall on the download
+    Downloads use normal certificate verification; on failure load_whisper falls back to fetching lazily
+    """
+    for name in names:
+        with contextlib.suppress(Exception):
+            download_model(name)
+
+
+def load_whisper(model_name):
+    """Load a CTranslate2 Whisper model - int8 on CPU, int8 weights with fp16 compute on CUDA"""
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_name, device="cuda", compute_type="int8_float16")
+    return WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=os.cpu_count())
+
+
+def speech_bounds(audio):
+    """Sample range spanning all detected speech in `audio`, or None if the chunk is silent"""
+    timestamps = get_speech_timestamps(audio, VadOptions())
+    if not timestamps:
+        return None
+    return timestamps[0]["start"], timestamps[-1]["end"]
+
+
+def transcribe_batch(model, chunks):
+    """Transcribe equal-length chunks, batching the Whisper decode when there are several"""
+    if len(chunks) == 1:
+        segments, _ = model.transcribe(chunks[0], language="en", beam_size=1, vad_filter=True)
+        return ["".join(segment.text for segment in segments).strip()]
+
+    # Lay the backlog end to end; the batched pipeline splits it on speech
+    # boundaries and encodes those segments together. Each segment is then
+    # credited to the chunk it starts in.
+    texts = [[] for _ in chunks]
+    segments, _ = BatchedInferencePipeline(model=model).transcribe(
+        np.concatenate(chunks), language="en", batch_size=WHISPER_BATCH
+    )
+    for segment in segments:
+        idx = min(int(segment.start // CHUNK_DURATION), len(chunks) - 1)
+        texts[idx].append(segment.text)
+    return ["".join(parts).strip() for parts in texts]
+
+
+def warm_up_models(model):
+    """Run each model once on dummy audio so lazy init doesn't land on the first real chunk"""
+    dummy = np.zeros(CHUNK_SAMPLES, dtype=np.float32)
+    speech_bounds(dummy)
+    # No VAD filter here, otherwise silence never reaches the encoder
+    segments, _ = model.transcribe(dummy, language="en", beam_size=1)
+    list(segments)
 
 
 def transcribe_with_smart_speakers(model_name="base"):
@@ -185,9 +340,13 @@ def transcribe_with_smart_speakers(model_name="base"):
     global is_recording
 
     print(f"\nLoading Whisper model '{model_name}'...")
-    model = whisper.load_model(model_name)
+    model = load_whisper(model_name)
     print("Model loaded! ✓")
 
+    print("Warming up model...")
+    warm_up_models(model)
+    models_ready.set()
+
     speaker_tracker = SpeakerTracker()
 
     session_file = OUTPUT_DIR / f"transcript_smart_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
@@ -196,43 +355,59 @@ def transcribe_with_smart_speakers(model_name="base"):
     print(f"Transcript will be saved to: {session_file}")
     print(f"Audio will be saved to: {audio_file}")
 
-    with open(session_file, 'w') as f:
-        f.write(f"Recording Session with Smart Speaker Detection\n")
-        f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: Whisper {model_name}\n")
-        f.write("=" * 70 + "\n\n")
+    # One buffered handle for the whole session instead of reopening it per chunk
+    session_fp = open(session_file, 'w', buffering=1 << 16)
+    session_fp.write(f"Recording Session with Smart Speaker Detection\n")
+    session_fp.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    session_fp.write(f"Model: Whisper {model_name}\n")
+    session_fp.write("=" * 70 + "\n\n")
 
-    audio_chunks = []
-    all_audio = []
+    chunk_scratch = np.empty((WHISPER_BATCH, CHUNK_SAMPLES), dtype=np.float32)
+    decoded = {}  # Chunk start sample -> text, for chunks decoded ahead in a batch
     chunk_counter = 0
+    entries_written = 0
 
     print("\n" + "=" * 70)
     print("  Recording started! Smart speaker detection enabled.")
     print("  System will learn to recognize different voices automatically.")
     print("=" * 70 + "\n")
 
-    while is_recording or not audio_queue.empty():
+    while is_recording or w_idx.value - r_idx.value >= CHUNK_SAMPLES:
         try:
-            chunk = audio_queue.get(timeout=1)
-            audio_chunks.append(chunk)
-            all_audio.append(chunk)
-
             # Process every CHUNK_DURATION seconds
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
+            if w_idx.value - r_idx.value >= CHUNK_SAMPLES:
                 chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks).flatten()
-                audio_chunks = []
+                chunk_start = r_idx.value
+                audio_data = read_float(chunk_start, chunk_scratch[0])
+                r_idx.value = chunk_start + CHUNK_SAMPLES
 
                 print(f"\n[Chunk {chunk_counter}] Processing...", end=" ")
 
+                # Silero VAD gate - silent chunks skip Whisper and speaker detection entirely
+                bounds = speech_bounds(audio_data)
+                if bounds is None:
+                    decoded.pop(chunk_start, None)
+                    print("✗ (silence/noise)")
+                    continue
+
                 try:
                     # Identify speaker based on voice features
                     speaker_id = speaker_tracker.identify_speaker(audio_data)
 
-                    # Transcribe
-                    audio_float = audio_data.astype(np.float32)
-                    result = model.transcribe(audio_float, language="en", fp16=False)
-                    text = result["text"].strip()
+                    # Transcribe - if chunks have backed up behind this one,
+                    # decode them in the same Whisper batch and reuse the text later
+                    if chunk_start not in decoded:
+                        backlog = min(WHISPER_BATCH - 1, (w_idx.value - r_idx.value) // CHUNK_SAMPLES)
+                        starts = [chunk_start + i * CHUNK_SAMPLES for i in range(backlog + 1)]
+                        batch = [audio_data] + [
+                            read_float(start, chunk_scratch[i])
+                            for i, start in enumerate(starts[1:], 1)
+                        ]
+                        if len(batch) == 1:
+                            # Nothing queued behind - only hand Whisper the span with speech
+                            batch[0] = audio_data[bounds[0]:bounds[1]]
+                        decoded.update(zip(starts, transcribe_batch(model, batch)))
+                    text = decoded.pop(chunk_start)
 
                     if text:
                         timestamp = datetime.now().strftime('%H:%M:%S')
@@ -242,33 +417,40 @@ def transcribe_with_smart_speakers(model_name="base"):
                         print(f"[Speaker {speaker_id}] [{timestamp}] {text}")
 
                         # Write to file
-                        with open(session_file, 'a') as f:
-                            f.write(f"[Speaker {speaker_id}] [{timestamp}]\n")
-                            f.write(f"{text}\n\n")
+                        session_fp.write(f"[Speaker {speaker_id}] [{timestamp}]\n")
+                        session_fp.write(f"{text}\n\n")
+                        entries_written += 1
+                        if entries_written % SESSION_FLUSH_EVERY == 0:
+                            session_fp.flush()
                     else:
                         print("✗ (silence/noise)")
 
                 except Exception as e:
                     print(f"✗ Error: {e}")
-                    import traceback
                     traceback.print_exc()
 
-        except queue.Empty:
-            continue
+            else:
+                time.sleep(0.1)
+
         except KeyboardInterrupt:
             break
 
     # Save audio file
-    if all_audio:
+    if dropped_samples:
+        print(f"\n⚠️  Dropped {dropped_samples / SAMPLE_RATE:.1f}s of audio - transcription fell too far behind")
+
+    total_samples = w_idx.value
+    if total_samples:
         print(f"\nSaving audio recording...")
-        audio_data = np.concatenate(all_audio).flatten()
-        audio_int16 = (audio_data * 32767).astype(np.int16)
+        block_scratch = np.empty(SAMPLE_RATE, dtype=np.int16)
 
         with wave.open(str(audio_file), 'wb') as wf:
             wf.setnchannels(CHANNELS)
             wf.setsampwidth(2)
             wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(audio_int16.tobytes())
+            # The ring already holds int16 PCM - stream it out in 1-second blocks
+            for start in range(max(0, total_samples - SESSION_SAMPLES), total_samples, SAMPLE_RATE):
+                wf.writeframes(read_ring(start, min(SAMPLE_RATE, total_samples - start), block_scratch))
 
         print(f"✓ Audio saved: {audio_file}")
 
@@ -284,7 +466,7 @@ def transcribe_with_smart_speakers(model_name="base"):
                   f"Spectral={profile['spectral']}")
 
     # Write speaker summary to file
-    with open(session_file, 'a') as f:
+    with session_fp as f:
         f.write("\n" + "=" * 70 + "\n")
         f.write("SESSION SUMMARY\n")
         f.write("=" * 70 + "\n\n")
@@ -309,9 +491,12 @@ def main():
 
     if not WHISPER_AVAILABLE:
         print("\nERROR: Whisper not installed!")
-        print("Install with: pip install openai-whisper")
+        print("Install with: pip install faster-whisper")
         sys.exit(1)
 
+    # Fetch the offered model sizes while the device/model prompts are up
+    threading.Thread(target=ensure_models, args=(("tiny", "base"),), daemon=True).start()
+
     # List devices
     devices = list_audio_devices()
 
@@ -339,6 +524,11 @@ def main():
     )
     transcribe_thread.start()
 
+    # Don't open the stream until the models are loaded and warmed up
+    while not models_ready.wait(timeout=1):
+        if not transcribe_thread.is_alive():
+            sys.exit(1)
+
     try:
         with sd.InputStream(
             device=device_id,
@@ -6,13 +6,16 @@ Records in real-time, transcribes, then identifies speakers at the end
 
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
+import argparse
 from datetime import datetime
 from pathlib import Path
 import threading
+import contextlib
+from functools import lru_cache
+from collections import deque
 import wave
-import ssl
+from types import SimpleNamespace
 import os
 from dotenv import load_dotenv
 import warnings
@@ -25,16 +28,24 @@ warnings.filterwarnings('ignore', message='.*torchcodec.*')
 warnings.filterwarnings('ignore', category=UserWarning, module='pyannote.audio.core.io')
 warnings.filterwarnings('ignore', category=UserWarning, module='pyannote.audio.models.blocks.pooling')
 
-# Fix SSL
-ssl._create_default_https_context = ssl._create_unverified_context
-
 # Imports
 try:
-    import whisper
+    from faster_whisper import WhisperModel, download_model
+    import ctranslate2
     WHISPER_AVAILABLE = True
 except ImportError:
     WHISPER_AVAILABLE = False
 
+try:
+    # Fallback for x86 servers without CTranslate2
+    import onnxruntime as ort
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import WhisperProcessor
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
 try:
     from pyannote.audio import Pipeline
     import torch
@@ -45,15 +56,28 @@ except ImportError:
 # Configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
-CHUNK_DURATION = 8  # Transcribe every 8 seconds
+CHUNK_DURATION = 3.0  # Starting chunk length; adapted to the backlog after every chunk
+MIN_CHUNK_DURATION = 1.5
+MAX_CHUNK_DURATION = 15.0
+BACKLOG_BLOCKS = 10  # Queued callback blocks above which the next chunk grows
+LIVE_MODEL = "distil-small.en"  # Draft text while recording; the chosen model re-transcribes the session at the end
+MAX_QUEUED_BLOCKS = 10 * 60 * SAMPLE_RATE // 1024  # ~10 minutes of backlog before the oldest blocks drop
+INT16_SCALE = np.float32(1 / 32768)
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
+ONNX_DIR = Path.home() / ".cache" / "whisper-onnx-int8"
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-audio_queue = queue.Queue()
+# Callback -> worker hand-off. One producer and one consumer, so a deque
+# (atomic append/popleft) plus an Event replaces Queue's lock and condition.
+audio_blocks = deque(maxlen=MAX_QUEUED_BLOCKS)
+audio_ready = threading.Event()
+dropped_samples = 0  # Audio the full deque pushed out before the worker read it
 is_recording = True
+diarization_pipeline = None  # Loaded on first use, then kept for later sessions in this process
+diarization_lock = threading.Lock()  # A caller arriving mid-load waits for it instead of loading twice
 
 
 def list_audio_devices():
@@ -68,60 +92,157 @@ def list_audio_devices():
 
 
 def audio_callback(indata, frames, time, status):
-    """Callback for audio stream"""
+    """Callback for audio stream - queues the raw int16 PCM"""
+    global dropped_samples
     if status:
         print(f"Audio status: {status}", file=sys.stderr)
-    audio_queue.put(indata.copy())
+    # A full deque drops its oldest block on append
+    if len(audio_blocks) == audio_blocks.maxlen:
+        dropped_samples += len(audio_blocks[0])
+    # indata is reused once the callback returns, so queue a copy
+    audio_blocks.append(np.frombuffer(indata, dtype=np.int16).copy())
+    audio_ready.set()
+
+
+def next_block(timeout):
+    """Pop the oldest queued audio block, waiting up to `timeout` seconds; None if none arrived"""
+    if not audio_blocks:
+        audio_ready.wait(timeout)
+        audio_ready.clear()
+    try:
+        return audio_blocks.popleft()
+    except IndexError:
+        return None
+
+
+class OnnxWhisper:
+    """
+    Whisper on ONNX Runtime with int8 dynamic quantization (VNNI MatMul kernels on x86)
+    Exposes the slice of WhisperModel.transcribe() used here; compute type is fixed at int8
+    """
+
+    def __init__(self, model_name):
+        model_dir = ONNX_DIR / model_name
+        if not any(model_dir.glob("*_quantized.onnx")):
+            # One-time export and per-channel quantization; later runs load the int8 files directly
+            repo = f"distil-whisper/{model_name}" if model_name.startswith("distil-") else f"openai/whisper-{model_name}"
+            ORTModelForSpeechSeq2Seq.from_pretrained(repo, export=True).save_pretrained(model_dir)
+            WhisperProcessor.from_pretrained(repo).save_pretrained(model_dir)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+            for onnx_file in list(model_dir.glob("*.onnx")):
+                quantizer = ORTQuantizer.from_pretrained(model_dir, file_name=onnx_file.name)
+                quantizer.quantize(save_dir=model_dir, quantization_config=qconfig)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count()
+        files = {
+            f"{part}_file_name": f"{part}_model_quantized.onnx"
+            for part in ("encoder", "decoder", "decoder_with_past")
+            if (model_dir / f"{part}_model_quantized.onnx").exists()
+        }
+        self.model = ORTModelForSpeechSeq2Seq.from_pretrained(
+            model_dir, session_options=options, provider="CPUExecutionProvider", **files
+        )
+        self.processor = WhisperProcessor.from_pretrained(model_dir)
+        # English-only checkpoints have no language or task tokens - generate() rejects both
+        self.english_only = model_name.endswith(".en")
+
+    def transcribe(self, audio, language=None, **_):
+        features = self.processor(audio, sampling_rate=SAMPLE_RATE, return_tensors="pt").input_features
+        if self.english_only:
+            tokens = self.model.generate(features)
+        else:
+            tokens = self.model.generate(features, language=language, task="transcribe")
+        text = self.processor.batch_decode(tokens, skip_special_tokens=True)[0]
+        return [SimpleNamespace(text=text)], None
+
+
+def ensure_models(names):
+    """
+    Pre-fetch Whisper weights into the Hugging Face cache so the first session doesn't stall on the download
+    Downloads use normal certificate verification; on failure load_whisper falls back to fetching lazily
+    """
+    for name in names:
+        with contextlib.suppress(Exception):
+            download_model(name)
+
 
+@lru_cache(maxsize=4)  # Later sessions in the same process reuse the resident weights
+def load_whisper(model_name, compute_type=None):
+    """
+    Load a CTranslate2 Whisper model - int8 on CPU, int8 weights with fp16 compute on CUDA
+    `compute_type` overrides that default (e.g. float32 for comparison runs)
+    Without CTranslate2, falls back to the int8 ONNX Runtime export
+    """
+    if not WHISPER_AVAILABLE:
+        return OnnxWhisper(model_name)
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_name, device="cuda", compute_type=compute_type or "int8_float16")
+    return WhisperModel(model_name, device="cpu", compute_type=compute_type or "int8", cpu_threads=os.cpu_count())
 
-def transcribe_and_record(model_name="base"):
+
+def transcribe_and_record(audio_file, model_name=LIVE_MODEL, compute_type=None):
     """
-    Record and transcribe in real-time
-    Returns list of (timestamp, text) tuples and audio data
+    Record and transcribe in real-time, streaming the audio to `audio_file`
+    Returns list of (timestamp, text) tuples and the number of samples recorded
     """
     global is_recording
 
     print(f"\nLoading Whisper model '{model_name}'...")
-    model = whisper.load_model(model_name)
+    model = load_whisper(model_name, compute_type)
     print("✓ Whisper loaded\n")
 
+    # Audio goes to disk chunk by chunk as it is transcribed
+    wf = wave.open(str(audio_file), 'wb')
+    wf.setnchannels(CHANNELS)
+    wf.setsampwidth(2)
+    wf.setframerate(SAMPLE_RATE)
+    recorded_samples = 0
+    chunk_secs = CHUNK_DURATION
+    # float32 form of each chunk for Whisper, reused; a chunk can overshoot by up to one callback block
+    chunk_buffer = np.empty(int(MAX_CHUNK_DURATION * SAMPLE_RATE) + SAMPLE_RATE, dtype=np.float32)
+
     audio_chunks = []
-    all_audio = []
+    pending_samples = 0  # Samples in audio_chunks - callbacks don't always deliver the requested blocksize
     transcripts = []  # Store (start_time, end_time, text) tuples
     chunk_counter = 0
-    start_time = datetime.now()
 
     print("=" * 70)
     print("  Recording started! Speak naturally.")
     print("  Press Ctrl+C to stop and process speakers.")
     print("=" * 70 + "\n")
 
-    while is_recording or not audio_queue.empty():
+    while is_recording or audio_blocks:
         try:
-            chunk = audio_queue.get(timeout=1)
+            chunk = next_block(timeout=1)
+            if chunk is None:
+                continue
             audio_chunks.append(chunk)
-            all_audio.append(chunk)
+            pending_samples += len(chunk)
 
-            # Transcribe every CHUNK_DURATION seconds
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
+            # Transcribe every chunk_secs seconds of audio
+            if pending_samples >= chunk_secs * SAMPLE_RATE:
                 chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks).flatten()
+                pcm = np.concatenate(audio_chunks)
                 audio_chunks = []
+                pending_samples = 0
+                wf.writeframes(pcm)
+                # Only the slice Whisper sees is dequantized
+                audio_data = np.multiply(pcm, INT16_SCALE, out=chunk_buffer[:len(pcm)])
+                # Position in the recording, from samples rather than wall-clock time
+                chunk_start = recorded_samples / SAMPLE_RATE
+                recorded_samples += len(audio_data)
+                chunk_end = recorded_samples / SAMPLE_RATE
 
-                print(f"[Chunk {chunk_counter}] Transcribing...", end=" ")
+                print(f"[Chunk {chunk_counter}, {len(pcm) / SAMPLE_RATE:.1f}s] Transcribing...", end=" ")
 
                 try:
                     # Transcribe
-                    audio_float = audio_data.astype(np.float32)
-                    result = model.transcribe(audio_float, language="en", fp16=False)
-                    text = result["text"].strip()
+                    segments, _ = model.transcribe(audio_data, language="en", beam_size=1, vad_filter=True)
+                    text = "".join(segment.text for segment in segments).strip()
 
                     if text:
-                        # Calculate time in recording
-                        elapsed = (datetime.now() - start_time).total_seconds()
-                        chunk_start = elapsed - CHUNK_DURATION
-                        chunk_end = elapsed
-
                         transcripts.append((chunk_start, chunk_end, text))
 
                         timestamp = datetime.now().strftime('%H:%M:%S')
@@ -133,14 +254,73 @@ def transcribe_and_record(model_name="base"):
                 except Exception as e:
                     print(f"✗ Error: {e}\n")
 
-        except queue.Empty:
-            continue
+                # Behind: longer chunks amortize each encoder pass. Caught up: shorter ones cut latency
+                backlog = len(audio_blocks)
+                if backlog > BACKLOG_BLOCKS:
+                    chunk_secs = min(MAX_CHUNK_DURATION, chunk_secs * 1.5)
+                    print(f"  ↑ {backlog} blocks queued, next chunk {chunk_secs:.1f}s\n")
+                else:
+                    chunk_secs = max(MIN_CHUNK_DURATION, chunk_secs * 0.8)
+
         except KeyboardInterrupt:
             break
 
-    # Return transcripts and full audio
-    full_audio = np.concatenate(all_audio).flatten() if all_audio else np.array([])
-    return transcripts, full_audio
+    # Keep the partial chunk left when recording stopped
+    if audio_chunks:
+        tail = np.concatenate(audio_chunks)
+        wf.writeframes(tail)
+        recorded_samples += len(tail)
+    wf.close()
+
+    return transcripts, recorded_samples
+
+
+def read_session_audio(audio_file):
+    """
+    Session WAV as float32 in [-1, 1]
+    The PCM is memory-mapped in place (the data chunk is the file's last bytes)
+    and dequantized in one pass - no readframes() copy of the whole session
+    """
+    with wave.open(str(audio_file), 'rb') as wf:
+        num_samples = wf.getnframes()
+    offset = Path(audio_file).stat().st_size - num_samples * 2
+    pcm = np.memmap(audio_file, dtype=np.int16, mode='r', offset=offset, shape=(num_samples,))
+    return np.multiply(pcm, np.float32(1 / 32768), out=np.empty(num_samples, dtype=np.float32))
+
+
+def retranscribe_session(audio_file, model_name="base", compute_type=None):
+    """
+    Final pass: transcribe the whole session WAV in one go with `model_name`
+    Returns (start, end, text) segments to replace the live drafts
+    """
+    model = load_whisper(model_name, compute_type)
+    segments, _ = model.transcribe(
+        read_session_audio(audio_file), language="en", word_timestamps=True, vad_filter=True
+    )
+    return [(segment.start, segment.end, segment.text.strip()) for segment in segments if segment.text.strip()]
+
+
+def load_diarization(hf_token=None):
+    """Load the pyannote pipeline once per process, on the GPU when there is one"""
+    global diarization_pipeline
+    with diarization_lock:
+        if diarization_pipeline is None:
+            pipeline = Pipeline.from_pretrained(
+                "pyannote/speaker-diarization-3.1",
+                token=hf_token if hf_token else True
+            )
+            if torch.cuda.is_available():
+                pipeline.to(torch.device("cuda"))
+            diarization_pipeline = pipeline
+    return diarization_pipeline
+
+
+def preload_diarization(hf_token=None):
+    """Background load of the pyannote pipeline; failures surface again when diarization runs"""
+    try:
+        load_diarization(hf_token)
+    except Exception:
+        pass
 
 
 def add_speakers_to_transcript(audio_file, transcripts, hf_token=None):
@@ -158,22 +338,10 @@ def add_speakers_to_transcript(audio_file, transcripts, hf_token=None):
 
     try:
         # Load diarization pipeline
-        pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
-            token=hf_token if hf_token else True
-        )
+        pipeline = load_diarization(hf_token)
 
-        # Load the WAV file manually and convert to tensor
-        import wave
-        import torch
-
-        with wave.open(str(audio_file), 'rb') as wf:
-            # Read audio data
-            frames = wf.readframes(wf.getnframes())
-            # Convert to numpy array
-            audio_data = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
-            # Convert to torch tensor
-            waveform = torch.from_numpy(audio_data).unsqueeze(0)
+        # Map the WAV written during recording and convert to tensor (zero-copy view)
+        waveform = torch.from_numpy(read_session_audio(audio_file)).unsqueeze_(0)
 
         # Create audio input dict for pyannote
         audio_input = {
@@ -181,9 +349,9 @@ def add_speakers_to_transcript(audio_file, transcripts, hf_token=None):
             "sample_rate": SAMPLE_RATE
         }
 
-        # Suppress warnings during diarization
-        import warnings
-        with warnings.catch_warnings():
+        # Suppress warnings during diarization; on GPU run the networks in fp16
+        with warnings.catch_warnings(), torch.inference_mode(), \
+                torch.autocast("cuda", dtype=torch.float16, enabled=torch.cuda.is_available()):
             warnings.filterwarnings('ignore')
             # Run diarization on the audio tensor
             diarize_output = pipeline(audio_input)
@@ -197,19 +365,24 @@ def add_speakers_to_transcript(audio_file, transcripts, hf_token=None):
 
         print("✓ Speaker detection complete!\n")
 
-        # Match speakers to transcript segments
+        # Diarization turns as arrays sorted by start, so each transcript
+        # segment is matched by binary search instead of a scan of every turn
+        turns = sorted((segment.start, segment.end, label)
+                       for segment, _, label in diarization.itertracks(yield_label=True))
+        starts = np.array([turn[0] for turn in turns])
+        ends = np.array([turn[1] for turn in turns])
+        # Furthest end among turns up to each one - nondecreasing, so it can be searched too
+        reach = np.maximum.accumulate(ends)
+
+        # Match speakers to transcript segments by who was talking at their midpoint:
+        # the earliest-starting turn containing it, as when every turn was scanned in order.
+        # That is the first turn whose reach gets to the midpoint, if it started by then
+        mids = np.array([(start + end) / 2 for start, end, _ in transcripts])
+        last_started = np.searchsorted(starts, mids, side='right') - 1
+        first_reaching = np.searchsorted(reach, mids, side='left')
         results = []
-        for start, end, text in transcripts:
-            # Find which speaker was talking during this time
-            segment_mid = (start + end) / 2
-            speaker = "Unknown"
-
-            # Check each diarization segment
-            for segment, _, label in diarization.itertracks(yield_label=True):
-                if segment.start <= segment_mid <= segment.end:
-                    speaker = label
-                    break
-
+        for (start, end, text), first, last in zip(transcripts, first_reaching, last_started):
+            speaker = turns[first][2] if first <= last else "Unknown"
             results.append((start, end, speaker, text))
 
         # Count speakers
@@ -227,16 +400,29 @@ def add_speakers_to_transcript(audio_file, transcripts, hf_token=None):
 def main():
     global is_recording
 
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--compute-type",
+        default=None,
+        help="CTranslate2 compute type (default: int8 on CPU, int8_float16 on CUDA)"
+    )
+    args = parser.parse_args()
+
     print("=" * 70)
     print("  Audio Recording with Smart Speaker Detection")
     print("  Transcribes live, identifies speakers at the end")
     print("=" * 70)
 
-    if not WHISPER_AVAILABLE:
+    if not (WHISPER_AVAILABLE or ORT_AVAILABLE):
         print("\nERROR: Whisper not installed!")
-        print("Install with: pip install openai-whisper")
+        print("Install with: pip install faster-whisper")
+        print("   or, for ONNX Runtime: pip install optimum[onnxruntime] transformers")
         sys.exit(1)
 
+    if WHISPER_AVAILABLE:
+        # Fetch the offered model sizes while the device/model prompts are up
+        threading.Thread(target=ensure_models, args=((LIVE_MODEL, "tiny", "base"),), daemon=True).start()
+
     # Check for HF token
     hf_token = os.environ.get('HF_TOKEN')
     if hf_token:
@@ -257,12 +443,17 @@ def main():
     else:
         print("\nUsing default input device")
 
-    # Model selection
-    print("\nWhisper model:")
+    # Model selection. ONNX Runtime only decodes 30s windows, so there is no
+    # whole-session final pass - the chosen model transcribes live instead
+    if WHISPER_AVAILABLE:
+        print(f"\nLive drafts use {LIVE_MODEL}. Final-pass Whisper model:")
+    else:
+        print("\nWhisper model (ONNX Runtime, no final pass):")
     print("  1. tiny   - Fast")
     print("  2. base   - Recommended")
     model_choice = input("Select (1/2) [default: 2]: ").strip()
     model_name = "tiny" if model_choice == "1" else "base"
+    live_model = LIVE_MODEL if WHISPER_AVAILABLE else model_name
 
     # Create output files
     session_time = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -271,20 +462,26 @@ def main():
 
     # Start recording thread
     transcripts = []
-    full_audio = None
+    recorded_samples = 0
 
     def record_thread():
-        nonlocal transcripts, full_audio
-        transcripts, full_audio = transcribe_and_record(model_name)
+        nonlocal transcripts, recorded_samples
+        transcripts, recorded_samples = transcribe_and_record(audio_file, live_model, args.compute_type)
 
     thread = threading.Thread(target=record_thread, daemon=True)
     thread.start()
 
+    # Diarization only runs once recording stops; load its pipeline in the
+    # meantime so that wait is just the diarization itself
+    if PYANNOTE_AVAILABLE:
+        threading.Thread(target=preload_diarization, args=(hf_token,), daemon=True).start()
+
     try:
-        with sd.InputStream(
+        with sd.RawInputStream(
             device=device_id,
             channels=CHANNELS,
             samplerate=SAMPLE_RATE,
+            dtype='int16',
             callback=audio_callback,
             blocksize=1024
         ):
@@ -298,19 +495,25 @@ def main():
     print("Finishing transcription...")
     thread.join(timeout=15)
 
-    if full_audio is None or len(full_audio) == 0:
+    if dropped_samples:
+        print(f"\n⚠️  Dropped {dropped_samples / SAMPLE_RATE:.1f}s of audio - transcription fell too far behind;"
+              " it is missing from the saved WAV and later timestamps are early by that much")
+
+    if not recorded_samples:
         print("\n⚠️  No audio recorded")
         return
 
-    # Save audio file
-    print(f"\n💾 Saving audio to: {audio_file}")
-    audio_int16 = (full_audio * 32767).astype(np.int16)
-    with wave.open(str(audio_file), 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(2)
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes(audio_int16.tobytes())
-    print("✓ Audio saved")
+    # The recording thread already streamed the audio to disk
+    print(f"\n✓ Audio saved: {audio_file}")
+
+    # Replace the live drafts with one higher-quality pass over the whole recording
+    if WHISPER_AVAILABLE:
+        print(f"\nRe-transcribing the session with Whisper '{model_name}'...")
+        try:
+            transcripts = retranscribe_session(audio_file, model_name, args.compute_type)
+            print(f"✓ Final transcript: {len(transcripts)} segments")
+        except Exception as e:
+            print(f"⚠️  Final pass failed ({e}), keeping the live transcript")
 
     # Run speaker detection
     final_transcripts = add_speakers_to_transcript(audio_file, transcripts, hf_token)
@@ -321,7 +524,7 @@ def main():
         f.write(f"Recording Session with Speaker Detection\n")
         f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"Model: Whisper {model_name} + pyannote diarization\n")
-        f.write(f"Duration: {len(full_audio) / SAMPLE_RATE:.1f} seconds\n")
+        f.write(f"Duration: {recorded_samples / SAMPLE_RATE:.1f} seconds\n")
         f.write("=" * 70 + "\n\n")
 
         for start, end, speaker, text in final_transcripts:
@@ -6,20 +6,20 @@ Detects WHO is speaking (Speaker 1, Speaker 2, etc.)
 
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
 from datetime import datetime
 from pathlib import Path
 import threading
+import contextlib
+import multiprocessing
 import wave
-import ssl
-
-# Fix SSL
-ssl._create_default_https_context = ssl._create_unverified_context
+import os
+from math import gcd
 
 # Imports
 try:
-    import whisper
+    from faster_whisper import WhisperModel, download_model
+    import ctranslate2
     WHISPER_AVAILABLE = True
 except ImportError:
     WHISPER_AVAILABLE = False
@@ -30,17 +30,48 @@ try:
 except ImportError:
     PYANNOTE_AVAILABLE = False
 
+try:
+    from numba import njit, prange, set_num_threads
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+try:
+    from scipy.signal import resample_poly
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+try:
+    import webrtcvad
+    VAD_AVAILABLE = True
+except ImportError:
+    VAD_AVAILABLE = False
+
 # Configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK_DURATION = 10  # Process every 10 seconds for better speaker detection
+RING_SAMPLES = 1 << 21  # ~131s of backlog at 16kHz; a power of two so positions wrap with a mask
+INT16_SCALE = np.float32(1 / 32768)
+VAD_FRAME_MS = 30
+VAD_RATES = (8000, 16000, 32000, 48000)  # The only rates WebRTC VAD accepts
+MIN_SPEECH_RATIO = 0.1  # Chunks with fewer voiced frames than this skip the models
 OUTPUT_DIR = Path("transcripts")
 AUDIO_DIR = Path("recordings")
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
-audio_queue = queue.Queue()
+# Audio callback -> transcribe thread hand-off: a preallocated single-producer/
+# single-consumer ring. Cursors are absolute sample counts; only the callback
+# advances w_idx and only the transcribe thread advances r_idx, so no lock.
+ring = np.empty(RING_SAMPLES, dtype=np.int16)  # Raw PCM straight from the device
+w_idx = multiprocessing.Value('q', 0, lock=False)
+r_idx = multiprocessing.Value('q', 0, lock=False)
+data_ready = threading.Event()  # Set by the callback after each write
+dropped_samples = 0
 is_recording = True
 
 
@@ -56,45 +87,151 @@ def list_audio_devices():
 
 
 def audio_callback(indata, frames, time, status):
-    """Callback for audio stream"""
+    """Callback for audio stream - copies into the ring without allocating"""
+    global dropped_samples
     if status:
         print(f"Audio status: {status}", file=sys.stderr)
-    audio_queue.put(indata.copy())
 
+    write_pos = w_idx.value
+    # Never lap audio the transcribe thread hasn't read yet
+    if write_pos + frames - r_idx.value > RING_SAMPLES:
+        dropped_samples += frames
+        return
+
+    block = np.frombuffer(indata, dtype=np.int16)
+    start = write_pos & (RING_SAMPLES - 1)
+    end = start + frames
+    if end <= RING_SAMPLES:
+        ring[start:end] = block
+    else:
+        split = RING_SAMPLES - start
+        ring[start:] = block[:split]
+        ring[:end - RING_SAMPLES] = block[split:]
+    w_idx.value = write_pos + frames
+    data_ready.set()
 
-def simple_speaker_detection(audio_data, threshold=0.02):
+
+def read_ring(start, out):
+    """Copy ring samples from absolute position `start` into `out`"""
+    offset = start & (RING_SAMPLES - 1)
+    first = min(len(out), RING_SAMPLES - offset)
+    out[:first] = ring[offset:offset + first]
+    out[first:] = ring[:len(out) - first]
+    return out
+
+
+def native_rate(device_id):
+    """Rate to open the device at: its native rate if we can resample it ourselves, else SAMPLE_RATE"""
+    if not SCIPY_AVAILABLE:
+        return SAMPLE_RATE
+    return int(sd.query_devices(device_id, 'input')['default_samplerate'])
+
+
+def to_model_rate(audio, rate):
+    """Polyphase-resample a float32 chunk captured at `rate` to the models' SAMPLE_RATE"""
+    if rate == SAMPLE_RATE:
+        return audio
+    g = gcd(SAMPLE_RATE, rate)
+    return resample_poly(audio, SAMPLE_RATE // g, rate // g).astype(np.float32, copy=False)
+
+
+def has_speech(vad, pcm, rate, audio):
     """
-    Simple speaker change detection based on volume/energy changes
-    This is a basic approach - not as good as ML models but works offline
+    Whether enough of a chunk's 30 ms frames are voiced to be worth transcribing
+    Reads the raw int16 `pcm` when WebRTC VAD supports `rate`, else the 16 kHz float32 `audio`
+    """
+    if rate not in VAD_RATES:
+        pcm, rate = np.clip(audio * 32767, -32768, 32767).astype(np.int16), SAMPLE_RATE
+    frame = rate * VAD_FRAME_MS // 1000
+    num_frames = len(pcm) // frame
+    needed = max(1, int(num_frames * MIN_SPEECH_RATIO))
+    data = pcm.tobytes()
+    step = frame * 2  # Bytes per frame
+    voiced = 0
+    for i in range(num_frames):
+        if vad.is_speech(data[i * step:(i + 1) * step], rate):
+            voiced += 1
+            if voiced >= needed:
+                return True
+    return False
+
+
+def _count_energy_changes(audio, segment_length, threshold):
+    """
+    Count jumps in normalized RMS energy between consecutive segments
+    Written as plain loops so Numba can compile and parallelize it
 
-    Returns: estimated number of speaker changes
+    Returns -1 if the audio is shorter than one segment
     """
-    # Split audio into small segments
-    segment_length = SAMPLE_RATE // 4  # 250ms segments
-    num_segments = len(audio_data) // segment_length
+    num_segments = audio.size // segment_length
+    if num_segments == 0:
+        return -1
+
+    # Segments are independent - spread them across cores
+    energies = np.empty(num_segments, dtype=np.float32)
+    total = 0.0
+    for i in prange(num_segments):
+        base = i * segment_length
+        s = 0.0
+        for j in range(segment_length):
+            v = audio[base + j]
+            s += v * v
+        energies[i] = np.sqrt(s / segment_length)
+        total += energies[i]
+
+    # Normalize by the mean energy while counting changes
+    mean_energy = total / num_segments
+    scale = 1.0 / mean_energy if mean_energy > 0 else 1.0
 
-    energies = []
-    for i in range(num_segments):
-        segment = audio_data[i*segment_length:(i+1)*segment_length]
-        energy = np.sqrt(np.mean(segment**2))
-        energies.append(energy)
+    changes = 0
+    prev = energies[0]
+    for i in range(1, num_segments):
+        if abs(energies[i] - prev) * scale > threshold:
+            changes += 1
+        prev = energies[i]
+    return changes
 
-    if not energies:
-        return 1
 
-    # Detect significant energy changes (potential speaker changes)
-    energies = np.array(energies)
-    mean_energy = np.mean(energies)
+def _count_energy_changes_numpy(audio, segment_length, threshold):
+    """NumPy fallback for _count_energy_changes when Numba isn't installed"""
+    num_segments = audio.size // segment_length
+    if num_segments == 0:
+        return -1
 
-    # Normalize
+    segments = audio[:num_segments * segment_length].reshape(num_segments, segment_length)
+    energies = np.sqrt(np.einsum('ij,ij->i', segments, segments) / segment_length)
+    mean_energy = energies.mean()
     if mean_energy > 0:
-        energies = energies / mean_energy
+        energies /= mean_energy
+    return int(np.count_nonzero(np.abs(np.diff(energies)) > threshold))
 
-    # Count changes
-    changes = 0
-    for i in range(1, len(energies)):
-        if abs(energies[i] - energies[i-1]) > threshold:
-            changes += 1
+
+if NUMBA_AVAILABLE:
+    # An explicit signature compiles at import (from the on-disk cache after the
+    # first run) rather than on the first recorded chunk
+    count_energy_changes = njit(
+        "int64(float32[::1], int64, float64)", cache=True, fastmath=True, parallel=True
+    )(_count_energy_changes)
+    # Leave cores for Whisper's own thread pool
+    set_num_threads(max(1, os.cpu_count() // 2))
+else:
+    count_energy_changes = _count_energy_changes_numpy
+
+
+def simple_speaker_detection(audio_data, threshold=0.02):
+    """
+    Simple speaker change detection based on volume/energy changes
+    This is a basic approach - not as good as ML models but works offline
+
+    Returns: estimated number of speaker changes
+    """
+    # Compare 250ms segments
+    segment_length = SAMPLE_RATE // 4
+    audio = np.ascontiguousarray(audio_data, dtype=np.float32)
+
+    changes = count_energy_changes(audio, segment_length, threshold)
+    if changes < 0:
+        return 1
 
     # Estimate speakers (rough heuristic)
     estimated_speakers = min(1 + changes // 3, 4)  # Cap at 4 speakers
@@ -102,14 +239,32 @@ def simple_speaker_detection(audio_data, threshold=0.02):
     return estimated_speakers
 
 
-def transcribe_with_speakers(model_name="base"):
+def ensure_models(names):
+    """
+    Pre-fetch Whisper weights into the Hugging Face cache so the first session doesn't stall on the download
+    Downloads use normal certificate verification; on failure load_whisper falls back to fetching lazily
+    """
+    for name in names:
+        with contextlib.suppress(Exception):
+            download_model(name)
+
+
+def load_whisper(model_name):
+    """Load a CTranslate2 Whisper model - int8 on CPU, int8 weights with fp16 compute on CUDA"""
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_name, device="cuda", compute_type="int8_float16")
+    return WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=os.cpu_count())
+
+
+def transcribe_with_speakers(model_name="base", capture_rate=SAMPLE_RATE):
     """
     Transcribe audio with basic speaker detection
+    `capture_rate` is the rate the input stream was opened at
     """
     global is_recording
 
     print(f"\nLoading Whisper model '{model_name}'...")
-    model = whisper.load_model(model_name)
+    model = load_whisper(model_name)
     print("Model loaded! ✓")
 
     session_file = OUTPUT_DIR / f"transcript_speakers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
@@ -118,44 +273,57 @@ def transcribe_with_speakers(model_name="base"):
     print(f"Transcript will be saved to: {session_file}")
     print(f"Audio will be saved to: {audio_file}")
 
-    with open(session_file, 'w') as f:
-        f.write(f"Recording Session with Speaker Detection\n")
-        f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: Whisper {model_name}\n")
-        f.write("=" * 70 + "\n\n")
+    # Opened once for the whole session; line-buffered so each entry reaches disk as it's written
+    transcript_fp = open(session_file, 'w', buffering=1)
+    transcript_fp.write(f"Recording Session with Speaker Detection\n")
+    transcript_fp.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    transcript_fp.write(f"Model: Whisper {model_name}\n")
+    transcript_fp.write("=" * 70 + "\n\n")
 
-    audio_chunks = []
-    all_audio = []  # Store all audio for final save
+    blocks_per_chunk = int(CHUNK_DURATION * capture_rate / 1024)  # Ring holds device-rate samples
+    chunk_pcm = np.empty(blocks_per_chunk * 1024, dtype=np.int16)  # Read from the ring, reused every chunk
+    chunk_buffer = np.empty(len(chunk_pcm), dtype=np.float32)  # Its float32 form for the models
     chunk_counter = 0
     current_speaker = 1
+    vad = webrtcvad.Vad(2) if VAD_AVAILABLE else None  # Aggressiveness 0-3
+
+    # Audio goes to disk chunk by chunk as it is transcribed
+    wf = wave.open(str(audio_file), 'wb')
+    wf.setnchannels(CHANNELS)
+    wf.setsampwidth(2)
+    wf.setframerate(capture_rate)  # Saved at the device rate, before resampling
 
     print("\n" + "=" * 70)
     print("  Recording started! Speaker detection enabled.")
     print("  Speak clearly. Pause between speakers for better detection.")
     print("=" * 70 + "\n")
 
-    while is_recording or not audio_queue.empty():
+    while is_recording or w_idx.value - r_idx.value >= len(chunk_buffer):
         try:
-            chunk = audio_queue.get(timeout=1)
-            audio_chunks.append(chunk)
-            all_audio.append(chunk)
-
             # Process every CHUNK_DURATION seconds
-            if len(audio_chunks) >= int(CHUNK_DURATION * SAMPLE_RATE / 1024):
+            if w_idx.value - r_idx.value >= len(chunk_buffer):
                 chunk_counter += 1
-                audio_data = np.concatenate(audio_chunks).flatten()
-                audio_chunks = []
+                pcm = read_ring(r_idx.value, chunk_pcm)
+                r_idx.value += len(chunk_pcm)
+                wf.writeframes(pcm)
+                # Scale to float32 once per chunk, not per callback block
+                audio_data = to_model_rate(np.multiply(pcm, INT16_SCALE, out=chunk_buffer), capture_rate)
 
                 print(f"\n[Chunk {chunk_counter}] Processing...", end=" ")
 
+                # Silent chunks skip speaker detection and Whisper entirely
+                if vad and not has_speech(vad, pcm, capture_rate, audio_data):
+                    print("✗ (silence)")
+                    continue
+
                 try:
                     # Detect potential speaker changes
                     num_speakers = simple_speaker_detection(audio_data)
 
-                    # Transcribe
-                    audio_float = audio_data.astype(np.float32)
-                    result = model.transcribe(audio_float, language="en", fp16=False)
-                    text = result["text"].strip()
+                    # Transcribe (the chunk buffer is already float32)
+                    audio_float = audio_data
+                    segments, _ = model.transcribe(audio_float, language="en", beam_size=1, vad_filter=True)
+                    text = "".join(segment.text for segment in segments).strip()
 
                     if text:
                         # Simple speaker assignment (alternates if multiple detected)
@@ -171,37 +339,37 @@ def transcribe_with_speakers(model_name="base"):
                         print(f"{speaker_label} [{timestamp}] {text}")
 
                         # Write to file with speaker info
-                        with open(session_file, 'a') as f:
-                            f.write(f"{speaker_label} [{timestamp}]\n")
-                            f.write(f"{text}\n")
-                            if num_speakers > 1:
-                                f.write(f"(Detected {num_speakers} potential speakers in this segment)\n")
-                            f.write("\n")
+                        transcript_fp.write(f"{speaker_label} [{timestamp}]\n")
+                        transcript_fp.write(f"{text}\n")
+                        if num_speakers > 1:
+                            transcript_fp.write(f"(Detected {num_speakers} potential speakers in this segment)\n")
+                        transcript_fp.write("\n")
                     else:
                         print("✗ (silence)")
 
                 except Exception as e:
                     print(f"✗ Error: {e}")
 
-        except queue.Empty:
-            continue
+            else:
+                data_ready.wait(timeout=1)
+                data_ready.clear()
+
         except KeyboardInterrupt:
             break
 
-    # Save audio file
-    if all_audio:
-        print(f"\nSaving audio recording...")
-        audio_data = np.concatenate(all_audio).flatten()
-        audio_int16 = (audio_data * 32767).astype(np.int16)
+    # Keep the partial chunk still in the ring when recording stopped
+    tail = w_idx.value - r_idx.value
+    if tail:
+        wf.writeframes(read_ring(r_idx.value, chunk_pcm[:tail]))
+        r_idx.value += tail
+    wf.close()
 
-        with wave.open(str(audio_file), 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(2)
-            wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(audio_int16.tobytes())
+    if dropped_samples:
+        print(f"\n⚠️  Dropped {dropped_samples / capture_rate:.1f}s of audio - transcription fell too far behind")
 
-        print(f"✓ Audio saved: {audio_file}")
+    print(f"✓ Audio saved: {audio_file}")
 
+    transcript_fp.close()
     print(f"✓ Transcript saved: {session_file}")
 
 
@@ -214,9 +382,12 @@ def main():
 
     if not WHISPER_AVAILABLE:
         print("\nERROR: Whisper not installed!")
-        print("Install with: pip install openai-whisper")
+        print("Install with: pip install faster-whisper")
         sys.exit(1)
 
+    # Fetch the offered model sizes while the device/model prompts are up
+    threading.Thread(target=ensure_models, args=(("tiny", "base"),), daemon=True).start()
+
     if PYANNOTE_AVAILABLE:
         print("\n✓ Advanced speaker detection available (pyannote)")
     else:
@@ -235,6 +406,11 @@ def main():
     else:
         print("\nUsing default input device")
 
+    # Capture at the device's own rate; chunks are resampled to 16kHz for the models
+    capture_rate = native_rate(device_id)
+    if capture_rate != SAMPLE_RATE:
+        print(f"Capturing at {capture_rate} Hz, resampling to {SAMPLE_RATE} Hz")
+
     # Model selection
     print("\nWhisper model:")
     print("  1. tiny   - Fast")
@@ -245,16 +421,17 @@ def main():
     # Start transcription
     transcribe_thread = threading.Thread(
         target=transcribe_with_speakers,
-        args=(model_name,),
+        args=(model_name, capture_rate),
         daemon=True
     )
     transcribe_thread.start()
 
     try:
-        with sd.InputStream(
+        with sd.RawInputStream(
             device=device_id,
             channels=CHANNELS,
-            samplerate=SAMPLE_RATE,
+            samplerate=capture_rate,
+            dtype='int16',
             callback=audio_callback,
             blocksize=1024
         ):
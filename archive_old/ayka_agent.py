@@ -6,14 +6,25 @@ Analyzes conversation transcripts and sends email notifications
 
 import os
 import sys
-import json
+import orjson
+import hashlib
+import sqlite3
+from functools import lru_cache
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
 load_dotenv()
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_MAX_CHARS = 24_000  # Comfortably inside the embedding model's 8k-token input
+MODEL_EXTRACT = os.getenv("AYKA_MODEL_EXTRACT", "gpt-4o-mini")  # Tool-calling extraction
+SIMILARITY_THRESHOLD = 0.92  # Cosine similarity above which a stored analysis is reused
+MAX_TRANSCRIPT_CHARS = 120_000  # Longer transcripts keep their head and tail
 
 # Function definitions for OpenAI
 TOOLS = [
@@ -39,7 +50,7 @@ TOOLS = [
                         "properties": {
                             "summary": {
                                 "type": "string",
-                                "description": "Brief summary of the conversation"
+                                "description": "Human-readable summary of the conversation and the key takeaways - shown to the user as the final summary"
                             },
                             "speakers": {
                                 "type": "array",
@@ -114,6 +125,132 @@ TOOLS = [
 ]
 
 
+def truncate_middle(text, max_chars=MAX_TRANSCRIPT_CHARS):
+    """Keep the head and tail of an over-long transcript - openings and wrap-ups carry the most signal"""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n\n[... {len(text) - max_chars} characters omitted ...]\n\n{text[-half:]}"
+
+
+# Same text on every request, so the prompt prefix stays byte-identical for provider-side caching
+SYSTEM_PROMPT = """You are AYKA, an AI assistant specialized in lead generation from networking event conversations.
+
+Analyze the provided conversation transcript and:
+1. Identify all speakers, their roles, companies, and interests
+2. Extract lead generation opportunities (partnerships, investments, hiring, etc.)
+3. Determine action items and follow-ups
+4. Use the send_email_notification function to prepare an email summary
+5. Use the save_lead_data function to save structured lead information
+
+Call both functions in a single response. The email body's summary is the final
+summary shown to the user, so make it complete - there is no follow-up turn.
+
+Be specific and actionable in your analysis."""
+
+
+@lru_cache(maxsize=2)
+def get_openai(api_key):
+    """One OpenAI client (and connection pool) per key for the whole process"""
+    return OpenAI(api_key=api_key)
+
+
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)),
+    stop=stop_after_attempt(3),
+    wait=wait_random_exponential(multiplier=1, min=2, max=30),
+    reraise=True
+)
+def create_completion(client, request):
+    """chat.completions.create, retrying rate limits, timeouts and 5xx errors with jittered backoff"""
+    return client.chat.completions.create(**request)
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of chat completions, keyed on the full request
+    Completions are handled as plain JSON dicts - no Pydantic models past the API call
+    """
+
+    def __init__(self, path=Path("leads_data") / ".llm_cache.db"):
+        path.parent.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+
+    @staticmethod
+    def key(request):
+        """SHA-256 of the request - model, messages, tools and options all count"""
+        return hashlib.sha256(orjson.dumps(request, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+    def get(self, request):
+        """Cached response for this exact request, or None"""
+        row = self.db.execute("SELECT response FROM completions WHERE key = ?", (self.key(request),)).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def create(self, client, **request):
+        """client.chat.completions.create(**request), answered from the cache when seen before"""
+        response = self.get(request)
+        if response:
+            return response
+
+        response = create_completion(client, request).model_dump(mode="json")
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?)", (self.key(request), orjson.dumps(response))
+            )
+        return response
+
+
+class SemanticCache:
+    """
+    Analyses of earlier transcripts, looked up by embedding similarity
+    Catches re-worded near-duplicates that the exact-match LLMCache misses
+    Entries are scoped to the model, system prompt and tools that produced them
+    """
+
+    def __init__(self, db, threshold=SIMILARITY_THRESHOLD):
+        self.db = db
+        self.threshold = threshold
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(embeddings)")]
+        if columns and "scope" not in columns:
+            # Unscoped entries from before scoping can't be attributed to a model or prompt
+            self.db.execute("DROP TABLE embeddings")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, scope TEXT NOT NULL, embedding BLOB NOT NULL, response TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def scope(request):
+        """SHA-256 of everything in the request but the transcript - model, system prompt, tools, options"""
+        system = [m for m in request["messages"] if m["role"] == "system"]
+        return LLMCache.key(dict(request, messages=system))
+
+    def embed(self, client, text):
+        """Unit-length embedding, so a dot product is the cosine similarity"""
+        data = client.embeddings.create(model=EMBEDDING_MODEL, input=text[:EMBEDDING_MAX_CHARS]).data
+        vector = np.array(data[0].embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def lookup(self, scope, embedding):
+        """Stored response in `scope` closest to `embedding` and its similarity; None if below the threshold"""
+        rows = self.db.execute("SELECT embedding, response FROM embeddings WHERE scope = ?", (scope,)).fetchall()
+        if not rows:
+            return None, 0.0
+        scores = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows]) @ embedding
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None, float(scores[best])
+        return orjson.loads(rows[best][1]), float(scores[best])
+
+    def add(self, key, scope, embedding, response):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                (key, scope, embedding.tobytes(), orjson.dumps(response))
+            )
+
+
 class AYKAAgent:
     """AI Agent using OpenAI function calling for lead generation"""
 
@@ -122,13 +259,14 @@ class AYKAAgent:
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in .env file")
 
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = get_openai(self.api_key)
+        self.cache = LLMCache()  # Re-processing the same transcript skips the API entirely
+        self.semantic_cache = SemanticCache(self.cache.db)  # Near-duplicates cost one embedding call
         self.recipient_email = os.getenv("RECIPIENT_EMAIL", "demo@example.com")
 
     def read_transcript(self, transcript_file):
-        """Read transcript file"""
-        with open(transcript_file, 'r') as f:
-            return f.read()
+        """Read transcript file, trimmed to MAX_TRANSCRIPT_CHARS"""
+        return truncate_middle(Path(transcript_file).read_text(encoding="utf-8", errors="replace"))
 
     def send_email_notification(self, recipient, subject, body):
         """Function to send email (mock for demo)"""
@@ -177,12 +315,12 @@ class AYKAAgent:
         output_file = output_dir / filename
 
         data = {
-            "generated_at": datetime.now().isoformat(),
+            "generated_at": datetime.now(),  # orjson writes datetimes as ISO 8601
             "leads": leads
         }
 
-        with open(output_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Compact UTF-8 by default; AYKA_PRETTY=1 indents it for reading by hand
+        output_file.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 if os.getenv("AYKA_PRETTY") else None))
 
         print(f"\n💾 Lead data saved to: {output_file}")
 
@@ -201,6 +339,14 @@ class AYKAAgent:
         else:
             return {"status": "error", "message": f"Unknown function: {function_name}"}
 
+    def retarget(self, function_name, arguments, transcript_file):
+        """Point a tool call replayed from another transcript's analysis at this run's recipient and output file"""
+        if function_name == "send_email_notification":
+            return {**arguments, "recipient": self.recipient_email}
+        if function_name == "save_lead_data":
+            return {**arguments, "filename": f"leads_{Path(transcript_file).stem}.json"}
+        return arguments
+
     def process_transcript(self, transcript_file):
         """Process transcript using OpenAI function calling"""
 
@@ -213,18 +359,7 @@ class AYKAAgent:
         transcript_content = self.read_transcript(transcript_file)
         print(f"Length: {len(transcript_content)} characters\n")
 
-        # Create the prompt
-        system_prompt = """You are AYKA, an AI assistant specialized in lead generation from networking event conversations.
-
-Analyze the provided conversation transcript and:
-1. Identify all speakers, their roles, companies, and interests
-2. Extract lead generation opportunities (partnerships, investments, hiring, etc.)
-3. Determine action items and follow-ups
-4. Use the send_email_notification function to prepare an email summary
-5. Use the save_lead_data function to save structured lead information
-
-Be specific and actionable in your analysis."""
-
+        # Create the prompt - the transcript only goes into the user message
         user_prompt = f"""Analyze this networking conversation transcript and extract lead generation insights:
 
 TRANSCRIPT:
@@ -234,56 +369,69 @@ Use the available functions to:
 1. Send an email notification to '{self.recipient_email}' with key insights
 2. Save the extracted lead data for CRM integration"""
 
-        print("🔄 Analyzing with OpenAI GPT-4...")
+        print(f"🔄 Analyzing with OpenAI {MODEL_EXTRACT}...")
 
         # Call OpenAI with function calling
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ]
 
-        response = self.client.chat.completions.create(
-            model="gpt-4-turbo-preview",
+        request = dict(
+            model=MODEL_EXTRACT,
             messages=messages,
             tools=TOOLS,
             tool_choice="auto"
         )
+        response = self.cache.get(request)
+
+        # No exact match - look for an analysis of a near-identical transcript
+        embedding = None
+        reused = False
+        if response is None:
+            try:
+                embedding = self.semantic_cache.embed(self.client, transcript_content)
+                response, similarity = self.semantic_cache.lookup(SemanticCache.scope(request), embedding)
+                if response:
+                    reused = True
+                    print(f"♻️  Reusing the analysis of a near-identical transcript (similarity {similarity:.2f})")
+            except Exception as e:
+                print(f"⚠️  Semantic cache unavailable: {e}")
+
+        if response is None:
+            response = self.cache.create(self.client, **request)
+            if embedding is not None:
+                self.semantic_cache.add(LLMCache.key(request), SemanticCache.scope(request), embedding, response)
 
         # Process function calls
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
+        response_message = response["choices"][0]["message"]
+        tool_calls = response_message.get("tool_calls")
 
         if tool_calls:
             print(f"\n✅ AI requested {len(tool_calls)} function call(s)\n")
 
-            # Execute each function call
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-
+            # Execute the function calls concurrently - they're independent (email, file write).
+            # Their results are plain status dicts, so nothing goes back to the model
+            calls = [
+                (tool_call["function"]["name"], orjson.loads(tool_call["function"]["arguments"]))
+                for tool_call in tool_calls
+            ]
+            if reused:
+                # Only the analysis carries over - delivery follows this request
+                calls = [(name, self.retarget(name, args, transcript_file)) for name, args in calls]
+            for function_name, _ in calls:
                 print(f"\n🔧 Executing: {function_name}")
-                result = self.execute_function(function_name, function_args)
-
-                # Add function result to messages
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [tool_call.model_dump()]
-                })
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "name": function_name,
-                    "content": json.dumps(result)
-                })
-
-            # Get final response after function execution
-            final_response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=messages
+            with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+                futures = [pool.submit(self.execute_function, name, args) for name, args in calls]
+            for future in futures:
+                future.result()  # Re-raise anything a function raised
+
+            # The summary came with the calls
+            final_message = next(
+                (args.get("body", {}).get("summary") for name, args in calls if name == "send_email_notification"),
+                None
             )
 
-            final_message = final_response.choices[0].message.content
             if final_message:
                 print("\n" + "="*80)
                 print("💬 AI SUMMARY")
@@ -292,7 +440,7 @@ Use the available functions to:
 
         else:
             print("\n⚠️  No function calls were made")
-            print(f"\nResponse: {response_message.content}")
+            print(f"\nResponse: {response_message['content']}")
 
         print("\n" + "="*80)
         print("✅ Processing Complete")
@@ -5,6 +5,7 @@ Generate PDF documentation from markdown files
 
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 def check_dependencies():
@@ -49,6 +50,9 @@ def generate_pdf(markdown_file, output_pdf, use_latex=False):
         '-V', 'fontsize=11pt',
         '--highlight-style=tango'
     ]
+    if use_latex:
+        # Fail fast instead of stopping at pdflatex's interactive error prompt
+        cmd.append('--pdf-engine-opt=-interaction=batchmode')
 
     try:
         subprocess.run(cmd, check=True, capture_output=True)
@@ -74,15 +78,20 @@ def main():
         ('CLAUDE.md', 'AYKA_Agent_System.pdf'),
     ]
 
-    success_count = 0
-
+    found = []
     for md_file, pdf_file in docs:
         if Path(md_file).exists():
-            if generate_pdf(md_file, pdf_file, has_latex):
-                success_count += 1
+            found.append((md_file, pdf_file))
         else:
             print(f"⊘ Skipping {md_file} (not found)")
 
+    # Each conversion is its own pandoc/LaTeX process, so run them side by side
+    success_count = 0
+    if found:
+        with ThreadPoolExecutor(max_workers=len(found)) as pool:
+            results = pool.map(lambda doc: generate_pdf(doc[0], doc[1], has_latex), found)
+            success_count = sum(results)
+
     print("\n" + "="*50)
     print(f"✓ Generated {success_count}/{len(docs)} PDFs")
 
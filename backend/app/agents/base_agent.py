@@ -1,12 +1,125 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+import asyncio
+import hashlib
 import time
+import threading
+import weakref
+from functools import lru_cache
+import httpx
 from loguru import logger
-from anthropic import Anthropic
-from openai import OpenAI
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from app.core.config import settings
+from app.agents.semantic_cache import SemanticCache, embed
+
+# Transient provider failures worth retrying; anything else fails the call straight away.
+# Both SDKs use these class names - matched by name so neither SDK is imported here
+RETRYABLE_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+# LLM requests in flight across every agent in the process (threads; acall_llm has one per event loop)
+llm_slots = threading.BoundedSemaphore(10)
+
+# Async clients, their connection pool and the acall_llm semaphore, per event loop -
+# each is bound to the loop that first uses it, so the app, the batch poller's
+# thread and asyncio.run in scripts and tests each get their own
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Any, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+llm_retry = retry(
+    retry=retry_if_exception(is_retryable),
+    stop=stop_after_attempt(3),
+    wait=wait_random_exponential(multiplier=1, min=2, max=30),
+    reraise=True,
+)
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    if not settings.ENABLE_SEMANTIC_CACHE:
+        return None
+    return SemanticCache(settings.SEMANTIC_CACHE_PATH, settings.SEMANTIC_CACHE_THRESHOLD)
+
+
+def _loop_local() -> Dict[Any, Any]:
+    return _loop_state.setdefault(asyncio.get_running_loop(), {})
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Keep-alive HTTP/2 connection pool shared by the running loop's async SDK
+    clients, so concurrent requests to a provider are multiplexed over a few sockets
+    """
+    state = _loop_local()
+    if "http" not in state:
+        state["http"] = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return state["http"]
+
+
+def get_async_llm_slots() -> asyncio.Semaphore:
+    """
+    LLM requests in flight on the running loop
+    """
+    state = _loop_local()
+    if "slots" not in state:
+        state["slots"] = asyncio.Semaphore(10)
+    return state["slots"]
+
+
+async def close_http_client():
+    """
+    Close the running loop's connection pool and drop its async clients
+    """
+    state = _loop_state.pop(asyncio.get_running_loop(), {})
+    if "http" in state:
+        await state["http"].aclose()
+
+
+@lru_cache(maxsize=8)
+def get_client(provider: str, api_key: str):
+    """
+    One client per provider and key, shared by every agent so they reuse a
+    single connection pool. Each SDK is imported only when first needed
+    """
+    if provider == "openai":
+        from openai import OpenAI
+
+        return OpenAI(api_key=api_key)
+    if provider == "anthropic":
+        from anthropic import Anthropic
+
+        return Anthropic(api_key=api_key)
+    raise ValueError(f"Unsupported provider: {provider}")
+
+
+def get_async_client(provider: str, api_key: str):
+    """
+    get_client for the running event loop, on that loop's HTTP/2 pool
+    """
+    state = _loop_local()
+    key = (provider, api_key)
+    if key not in state:
+        if provider == "openai":
+            from openai import AsyncOpenAI
+
+            state[key] = AsyncOpenAI(api_key=api_key, http_client=get_http_client())
+        elif provider == "anthropic":
+            from anthropic import AsyncAnthropic
+
+            state[key] = AsyncAnthropic(api_key=api_key, http_client=get_http_client())
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+    return state[key]
 
 
 class BaseAgent(ABC):
@@ -17,22 +130,23 @@ class BaseAgent(ABC):
     def __init__(
         self,
         name: str,
-        model: str = "gpt-4-turbo-preview",
+        model: Optional[str] = None,
         provider: str = "openai",
         temperature: float = 0.7,
     ):
         self.name = name
-        self.model = model
+        self.model = model or settings.LLM_MODEL
         self.provider = provider
         self.temperature = temperature
 
         # Initialize LLM clients
         if provider == "openai":
-            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            self.api_key = settings.OPENAI_API_KEY
         elif provider == "anthropic":
-            self.client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+            self.api_key = settings.ANTHROPIC_API_KEY
         else:
             raise ValueError(f"Unsupported provider: {provider}")
+        self.client = get_client(provider, self.api_key)
 
     @abstractmethod
     def get_system_prompt(self) -> str:
@@ -48,80 +162,280 @@ class BaseAgent(ABC):
         """
         pass
 
+    async def aprocess(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async process - agents override this to await acall_llm; by default
+        the blocking process runs on a worker thread
+        """
+        return await asyncio.to_thread(self.process, input_data)
+
+    def _build_request(
+        self,
+        messages: list,
+        temperature: Optional[float],
+        max_tokens: int,
+        json_mode: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Provider-specific request arguments, shared by call_llm and acall_llm
+        """
+        temp = temperature if temperature is not None else self.temperature
+
+        # Canonical prefix: every system message, joined in order and trimmed, as a
+        # single block ahead of the conversation - the same bytes however callers
+        # arrange them, so provider prompt caches keep hitting
+        system_msg = "\n\n".join(
+            m["content"].strip() for m in messages if m["role"] == "system"
+        )
+        conversation = [m for m in messages if m["role"] != "system"]
+
+        if self.provider == "openai":
+            # System prompt first so every call shares the prefix OpenAI caches automatically
+            request = {
+                "model": self.model,
+                "messages": [{"role": "system", "content": system_msg}] + conversation
+                if system_msg
+                else conversation,
+                "temperature": temp,
+                "max_tokens": max_tokens,
+            }
+            if json_mode:
+                # Constrain the reply to a single valid JSON object
+                request["response_format"] = {"type": "json_object"}
+            return request
+
+        # Anthropic requires system message separately
+        request = {
+            "model": self.model,
+            "messages": conversation,
+            "temperature": temp,
+            "max_tokens": max_tokens,
+        }
+        if system_msg:
+            # The system prompt is identical across calls - mark it for prompt caching
+            request["system"] = [
+                {
+                    "type": "text",
+                    "text": system_msg,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
+        return request
+
+    def _read_response(self, response) -> str:
+        """
+        Log token usage (with cache hits) and return the response text
+        """
+        if self.provider == "openai":
+            details = response.usage.prompt_tokens_details
+            logger.info(
+                f"Agent '{self.name}' prompt tokens: {response.usage.prompt_tokens} "
+                f"({details.cached_tokens if details else 0} cached)"
+            )
+            return response.choices[0].message.content
+
+        logger.info(
+            f"Agent '{self.name}' input tokens: {response.usage.input_tokens} "
+            f"(cache read {response.usage.cache_read_input_tokens or 0}, "
+            f"written {response.usage.cache_creation_input_tokens or 0})"
+        )
+        return response.content[0].text
+
+    def _cache_scope(self, request: Dict[str, Any], owner: str) -> str:
+        """
+        Cache partition: owner, agent, model and system prompt - one owner never
+        gets another's responses, and a prompt edit starts a fresh scope
+        """
+        system = request.get("system") or [
+            m for m in request["messages"] if m["role"] == "system"
+        ]
+        digest = hashlib.sha256(str(system).encode()).hexdigest()[:16]
+        return f"{owner}:{self.name}:{self.model}:{digest}"
+
+    def _cached(self, request: Dict[str, Any], owner: Optional[str]):
+        """
+        (cache, scope, prompt embedding, cached response or None) for a request;
+        cache is None when semantic caching is off or the call has no owner
+        """
+        cache = get_semantic_cache()
+        if cache is None or owner is None:
+            return None, None, None, None
+        prompt = "\n".join(
+            str(m["content"]) for m in request["messages"] if m["role"] != "system"
+        )
+        scope = self._cache_scope(request, owner)
+        vector = embed(prompt)
+        return cache, scope, vector, cache.lookup(scope, vector)
+
+    def _endpoint(self, client):
+        return client.chat.completions if self.provider == "openai" else client.messages
+
+    @llm_retry
     def call_llm(
         self,
         messages: list,
         temperature: Optional[float] = None,
         max_tokens: int = 4000,
+        json_mode: bool = False,
+        cache_owner: Optional[str] = None,
     ) -> str:
         """
         Call the LLM with messages and return response
+        Rate limits, timeouts and 5xx errors are retried with jittered exponential backoff
+        json_mode asks OpenAI models for a guaranteed JSON object (other providers ignore it)
+        cache_owner (e.g. "user:42") enables the semantic cache, scoped to that owner
         """
-        temp = temperature if temperature is not None else self.temperature
+        request = self._build_request(messages, temperature, max_tokens, json_mode)
+        cache, scope, vector, cached = self._cached(request, cache_owner)
+        if cached is not None:
+            return cached
 
         try:
-            if self.provider == "openai":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=temp,
-                    max_tokens=max_tokens,
-                )
-                return response.choices[0].message.content
-
-            elif self.provider == "anthropic":
-                # Anthropic requires system message separately
-                system_msg = next(
-                    (m["content"] for m in messages if m["role"] == "system"), ""
-                )
-                user_messages = [m for m in messages if m["role"] != "system"]
-
-                response = self.client.messages.create(
-                    model=self.model,
-                    system=system_msg,
-                    messages=user_messages,
-                    temperature=temp,
-                    max_tokens=max_tokens,
-                )
-                return response.content[0].text
+            with llm_slots:
+                response = self._endpoint(self.client).create(**request)
+            text = self._read_response(response)
+            if cache is not None:
+                cache.store(scope, vector, text)
+            return text
 
         except Exception as e:
             logger.error(f"LLM call failed: {e}")
             raise
 
+    @llm_retry
+    async def acall_llm(
+        self,
+        messages: list,
+        temperature: Optional[float] = None,
+        max_tokens: int = 4000,
+        json_mode: bool = False,
+        cache_owner: Optional[str] = None,
+    ) -> str:
+        """
+        Async call_llm - awaits the provider on the event loop instead of
+        blocking a worker thread for the length of the request
+        """
+        request = self._build_request(messages, temperature, max_tokens, json_mode)
+        # Embedding is CPU work - keep it off the event loop
+        cache, scope, vector, cached = await asyncio.to_thread(
+            self._cached, request, cache_owner
+        )
+        if cached is not None:
+            return cached
+        client = get_async_client(self.provider, self.api_key)
+
+        try:
+            async with get_async_llm_slots():
+                response = await self._endpoint(client).create(**request)
+            text = self._read_response(response)
+            if cache is not None:
+                cache.store(scope, vector, text)
+            return text
+
+        except Exception as e:
+            logger.error(f"LLM call failed: {e}")
+            raise
+
+    def _report(self, start_time: float, **outcome) -> Dict[str, Any]:
+        """
+        Result envelope shared by execute and aexecute: results or error, plus timing
+        """
+        return {
+            "agent_name": self.name,
+            **outcome,
+            "model_used": self.model,
+            "processing_time": time.perf_counter() - start_time,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "success": "error" not in outcome,
+        }
+
     def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute the agent with timing and error handling
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         logger.info(f"Agent '{self.name}' starting execution")
 
         try:
-            results = self.process(input_data)
-            processing_time = time.time() - start_time
+            report = self._report(start_time, results=self.process(input_data))
+            logger.info(f"Agent '{self.name}' completed in {report['processing_time']:.2f}s")
+            return report
 
-            logger.info(
-                f"Agent '{self.name}' completed in {processing_time:.2f}s"
-            )
+        except Exception as e:
+            logger.error(f"Agent '{self.name}' failed: {e}")
+            return self._report(start_time, error=str(e))
 
-            return {
-                "agent_name": self.name,
-                "results": results,
-                "model_used": self.model,
-                "processing_time": processing_time,
-                "timestamp": datetime.utcnow().isoformat(),
-                "success": True,
-            }
+    async def aexecute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async execute - same envelope, with the agent awaited on the event loop
+        """
+        start_time = time.perf_counter()
+        logger.info(f"Agent '{self.name}' starting execution")
+
+        try:
+            report = self._report(start_time, results=await self.aprocess(input_data))
+            logger.info(f"Agent '{self.name}' completed in {report['processing_time']:.2f}s")
+            return report
 
         except Exception as e:
-            processing_time = time.time() - start_time
             logger.error(f"Agent '{self.name}' failed: {e}")
+            return self._report(start_time, error=str(e))
 
-            return {
-                "agent_name": self.name,
-                "error": str(e),
-                "model_used": self.model,
-                "processing_time": processing_time,
-                "timestamp": datetime.utcnow().isoformat(),
-                "success": False,
-            }
+
+class TranscriptAgent(BaseAgent):
+    """
+    Agent making a single JSON-mode LLM call per input: subclasses build the
+    messages and parse the reply, and get both process and aprocess from them
+    """
+
+    max_tokens = 4000
+
+    @abstractmethod
+    def build_messages(self, input_data: Dict[str, Any]) -> list:
+        """
+        Build the LLM messages for this input
+        """
+        pass
+
+    @abstractmethod
+    def parse_response(self, response: str) -> Dict[str, Any]:
+        """
+        Turn the LLM response into this agent's results
+        """
+        pass
+
+    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.build_messages(input_data)
+        return self.parse_response(
+            self.call_llm(
+                messages,
+                max_tokens=self.max_tokens,
+                json_mode=True,
+                cache_owner=input_data.get("cache_owner"),
+            )
+        )
+
+    async def aprocess(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.build_messages(input_data)
+        return self.parse_response(
+            await self.acall_llm(
+                messages,
+                max_tokens=self.max_tokens,
+                json_mode=True,
+                cache_owner=input_data.get("cache_owner"),
+            )
+        )
+
+    def batch_request(self, custom_id: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        One line of an OpenAI Batch API input file - the same request process would send
+        """
+        if self.provider != "openai":
+            raise ValueError(f"Batch requests are not supported for provider: {self.provider}")
+        messages = self.build_messages(input_data)
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": self._build_request(messages, None, self.max_tokens, json_mode=True),
+        }
@@ -1,29 +1,64 @@
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional
+import orjson
 from loguru import logger
 
-from app.agents.base_agent import BaseAgent
+from app.agents.base_agent import TranscriptAgent
 
 
-class ContentAnalyzerAgent(BaseAgent):
+def _extract_json(s: str) -> Optional[str]:
     """
-    Agent responsible for analyzing transcript content and extracting:
-    - Key topics and themes
-    - Business interests
-    - Pain points
-    - Opportunities mentioned
+    First balanced {...} substring of s, found in one pass tracking brace
+    depth and whether we are inside a JSON string
+    """
+    depth = 0
+    start = None
+    in_string = escaped = False
+    for i, ch in enumerate(s):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                return s[start : i + 1]
+    return None
+
+
+def _load_json(response: str) -> Optional[Dict[str, Any]]:
     """
+    Parse an LLM response as a JSON object, recovering one wrapped in prose
+    or code fences; None if there is none
+    """
+    try:
+        result = orjson.loads(response)
+    except orjson.JSONDecodeError:
+        # If LLM didn't return valid JSON, try to extract it
+        logger.warning("LLM response was not valid JSON, attempting to extract")
+        candidate = _extract_json(response)
+        if candidate is None:
+            return None
+        try:
+            result = orjson.loads(candidate)
+        except orjson.JSONDecodeError:
+            return None
 
-    def __init__(self):
-        super().__init__(
-            name="ContentAnalyzer",
-            model="gpt-4-turbo-preview",
-            provider="openai",
-            temperature=0.3,
-        )
+    # A bare array, string or number is valid JSON but not the object callers expect
+    return result if isinstance(result, dict) else None
 
-    def get_system_prompt(self) -> str:
-        return """You are an expert business analyst specializing in extracting insights from conversations at networking events.
+
+# System prompts are module constants: every request sends the same bytes, so
+# the provider-side prompt cache keeps matching the prefix
+_CONTENT_SYS = """You are an expert business analyst specializing in extracting insights from conversations at networking events.
 
 Your task is to analyze conversation transcripts and extract:
 
@@ -45,7 +80,92 @@ Return your analysis as a structured JSON object with these keys:
 
 Keep your analysis concise but comprehensive."""
 
-    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+_ENTITY_SYS = """You are an expert at extracting named entities from business conversations.
+
+Extract the following types of entities:
+1. PEOPLE: Full names of individuals mentioned
+2. COMPANIES: Company and organization names
+3. LOCATIONS: Cities, countries, regions mentioned in business context
+4. TECHNOLOGIES: Specific technologies, platforms, or tools mentioned
+5. PRODUCTS: Product or service names
+
+For each entity, provide:
+- type: The entity type
+- value: The entity name/value
+- confidence: Your confidence level (0.0 to 1.0)
+- context: Brief context of how it was mentioned
+
+Return as JSON with an "entities" array.
+
+Only extract entities that are clearly mentioned. Do not infer or assume."""
+
+_INTENT_SYS = """You are an expert at understanding business networking intentions.
+
+Analyze the conversation and identify what the person is LOOKING FOR and what they can OFFER.
+
+Looking for (needs):
+- Investment (seeking funding)
+- Partnership (business partnerships)
+- Hiring (looking to hire talent)
+- Learning (wants to learn or get mentorship)
+- Customers (looking for clients/customers)
+- Services (needs specific services)
+- Collaboration (project collaboration)
+
+Offering:
+- Investment (can provide funding)
+- Partnership (can be a partner)
+- Employment (offering jobs)
+- Mentorship (can mentor/teach)
+- Services (provides specific services)
+- Expertise (has specific knowledge/skills)
+- Network (can make introductions)
+
+For each intent, provide:
+- intent_type: The type of intent
+- description: Specific description
+- confidence: Confidence level (0.0 to 1.0)
+- urgency: high/medium/low
+- supporting_evidence: Quotes or context supporting this intent
+
+Return as JSON with "looking_for" and "offering" arrays."""
+
+# Section key in the fused response -> instructions and schema it follows
+_FUSED_SECTIONS = {
+    "content_analysis": _CONTENT_SYS,
+    "entities": _ENTITY_SYS,
+    "intents": _INTENT_SYS,
+}
+
+_FUSED_SYS = (
+    "You perform three analyses of the same networking-event conversation transcript.\n"
+    "Follow the instructions of each section below.\n\n"
+    + "\n\n".join(f"=== {key.upper()} ===\n{prompt}" for key, prompt in _FUSED_SECTIONS.items())
+    + f"\n\nReturn a single JSON object with exactly these top-level keys: {', '.join(_FUSED_SECTIONS)}.\n"
+    "Each key holds the JSON object its section asks for."
+)
+
+
+class ContentAnalyzerAgent(TranscriptAgent):
+    """
+    Agent responsible for analyzing transcript content and extracting:
+    - Key topics and themes
+    - Business interests
+    - Pain points
+    - Opportunities mentioned
+    """
+
+    def __init__(self):
+        super().__init__(
+            name="ContentAnalyzer",
+            provider="openai",
+            temperature=0.3,
+        )
+
+    def get_system_prompt(self) -> str:
+        return _CONTENT_SYS
+
+    def build_messages(self, input_data: Dict[str, Any]) -> list:
         """
         Analyze transcript content
 
@@ -57,7 +177,7 @@ Keep your analysis concise but comprehensive."""
             }
 
         Returns:
-            Dictionary with extracted insights
+            LLM messages asking for the extracted insights
         """
         transcript = input_data.get("transcript", "")
         if not transcript:
@@ -65,8 +185,7 @@ Keep your analysis concise but comprehensive."""
 
         logger.info(f"Analyzing transcript of length {len(transcript)}")
 
-        # Prepare messages for LLM
-        messages = [
+        return [
             {"role": "system", "content": self.get_system_prompt()},
             {
                 "role": "user",
@@ -79,29 +198,17 @@ Return as JSON.""",
             },
         ]
 
-        # Call LLM
-        response = self.call_llm(messages)
-
+    def parse_response(self, response: str) -> Dict[str, Any]:
         # Parse JSON response
-        try:
-            analysis = json.loads(response)
-        except json.JSONDecodeError:
-            # If LLM didn't return valid JSON, try to extract it
-            logger.warning("LLM response was not valid JSON, attempting to extract")
-            # Try to find JSON in the response
-            import re
-
-            json_match = re.search(r"\{.*\}", response, re.DOTALL)
-            if json_match:
-                analysis = json.loads(json_match.group())
-            else:
-                logger.error("Could not extract JSON from LLM response")
-                analysis = {"error": "Invalid response format", "raw": response}
+        analysis = _load_json(response)
+        if analysis is None:
+            logger.error("Could not extract JSON from LLM response")
+            analysis = {"error": "Invalid response format", "raw": response}
 
         return analysis
 
 
-class EntityExtractorAgent(BaseAgent):
+class EntityExtractorAgent(TranscriptAgent):
     """
     Agent responsible for extracting named entities:
     - People names
@@ -113,32 +220,14 @@ class EntityExtractorAgent(BaseAgent):
     def __init__(self):
         super().__init__(
             name="EntityExtractor",
-            model="gpt-4-turbo-preview",
             provider="openai",
             temperature=0.2,
         )
 
     def get_system_prompt(self) -> str:
-        return """You are an expert at extracting named entities from business conversations.
-
-Extract the following types of entities:
-1. PEOPLE: Full names of individuals mentioned
-2. COMPANIES: Company and organization names
-3. LOCATIONS: Cities, countries, regions mentioned in business context
-4. TECHNOLOGIES: Specific technologies, platforms, or tools mentioned
-5. PRODUCTS: Product or service names
-
-For each entity, provide:
-- type: The entity type
-- value: The entity name/value
-- confidence: Your confidence level (0.0 to 1.0)
-- context: Brief context of how it was mentioned
-
-Return as JSON with an "entities" array.
+        return _ENTITY_SYS
 
-Only extract entities that are clearly mentioned. Do not infer or assume."""
-
-    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def build_messages(self, input_data: Dict[str, Any]) -> list:
         """
         Extract named entities from transcript
 
@@ -148,7 +237,7 @@ Only extract entities that are clearly mentioned. Do not infer or assume."""
             }
 
         Returns:
-            Dictionary with extracted entities
+            LLM messages asking for the extracted entities
         """
         transcript = input_data.get("transcript", "")
         if not transcript:
@@ -156,7 +245,7 @@ Only extract entities that are clearly mentioned. Do not infer or assume."""
 
         logger.info("Extracting entities from transcript")
 
-        messages = [
+        return [
             {"role": "system", "content": self.get_system_prompt()},
             {
                 "role": "user",
@@ -168,18 +257,16 @@ Return as JSON with an "entities" array.""",
             },
         ]
 
-        response = self.call_llm(messages)
-
-        try:
-            result = json.loads(response)
-        except json.JSONDecodeError:
+    def parse_response(self, response: str) -> Dict[str, Any]:
+        result = _load_json(response)
+        if result is None:
             logger.error("Could not parse entity extraction response")
             result = {"entities": []}
 
         return result
 
 
-class IntentClassifierAgent(BaseAgent):
+class IntentClassifierAgent(TranscriptAgent):
     """
     Agent responsible for classifying user intents:
     - What are they looking for?
@@ -190,44 +277,14 @@ class IntentClassifierAgent(BaseAgent):
     def __init__(self):
         super().__init__(
             name="IntentClassifier",
-            model="gpt-4-turbo-preview",
             provider="openai",
             temperature=0.3,
         )
 
     def get_system_prompt(self) -> str:
-        return """You are an expert at understanding business networking intentions.
-
-Analyze the conversation and identify what the person is LOOKING FOR and what they can OFFER.
-
-Looking for (needs):
-- Investment (seeking funding)
-- Partnership (business partnerships)
-- Hiring (looking to hire talent)
-- Learning (wants to learn or get mentorship)
-- Customers (looking for clients/customers)
-- Services (needs specific services)
-- Collaboration (project collaboration)
-
-Offering:
-- Investment (can provide funding)
-- Partnership (can be a partner)
-- Employment (offering jobs)
-- Mentorship (can mentor/teach)
-- Services (provides specific services)
-- Expertise (has specific knowledge/skills)
-- Network (can make introductions)
-
-For each intent, provide:
-- intent_type: The type of intent
-- description: Specific description
-- confidence: Confidence level (0.0 to 1.0)
-- urgency: high/medium/low
-- supporting_evidence: Quotes or context supporting this intent
-
-Return as JSON with "looking_for" and "offering" arrays."""
+        return _INTENT_SYS
 
-    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def build_messages(self, input_data: Dict[str, Any]) -> list:
         """
         Classify user intents
 
@@ -238,7 +295,7 @@ Return as JSON with "looking_for" and "offering" arrays."""
             }
 
         Returns:
-            Dictionary with classified intents
+            LLM messages asking for the classified intents
         """
         transcript = input_data.get("transcript", "")
         user_category = input_data.get("user_category", "general")
@@ -248,7 +305,7 @@ Return as JSON with "looking_for" and "offering" arrays."""
 
         logger.info(f"Classifying intents for {user_category} user")
 
-        messages = [
+        return [
             {"role": "system", "content": self.get_system_prompt()},
             {
                 "role": "user",
@@ -262,12 +319,84 @@ Return as JSON.""",
             },
         ]
 
-        response = self.call_llm(messages)
-
-        try:
-            result = json.loads(response)
-        except json.JSONDecodeError:
+    def parse_response(self, response: str) -> Dict[str, Any]:
+        result = _load_json(response)
+        if result is None:
             logger.error("Could not parse intent classification response")
             result = {"looking_for": [], "offering": []}
 
         return result
+
+
+class FusedAnalyzerAgent(TranscriptAgent):
+    """
+    Agent that runs content analysis, entity extraction and intent
+    classification in a single LLM call, so the transcript is sent once
+    instead of three times
+    """
+
+    # Room for all three sections in one response
+    max_tokens = 8000
+
+    def __init__(self):
+        super().__init__(
+            name="FusedAnalyzer",
+            provider="openai",
+            temperature=0.3,
+        )
+
+    def get_system_prompt(self) -> str:
+        return _FUSED_SYS
+
+    def build_messages(self, input_data: Dict[str, Any]) -> list:
+        """
+        Run all three analyses on a transcript
+
+        Args:
+            input_data: {
+                "transcript": str,
+                "user_category": str  # ceo_investor, student, general
+            }
+
+        Returns:
+            LLM messages asking for all three analyses
+        """
+        transcript = input_data.get("transcript", "")
+        user_category = input_data.get("user_category", "general")
+
+        if not transcript:
+            raise ValueError("No transcript provided")
+
+        logger.info(f"Running fused analysis for {user_category} user")
+
+        return [
+            {"role": "system", "content": self.get_system_prompt()},
+            {
+                "role": "user",
+                "content": f"""This conversation is from a {user_category} at a networking event.
+
+Transcript:
+{transcript}
+
+Return as JSON with content_analysis, entities and intents keys.""",
+            },
+        ]
+
+    def parse_response(self, response: str) -> Dict[str, Any]:
+        result = _load_json(response)
+        if result is None:
+            logger.error("Could not parse fused analysis response")
+            result = {}
+
+        def section(key: str, fallback: Dict[str, Any]) -> Dict[str, Any]:
+            # Missing or non-object sections get the single agent's fallback
+            value = result.get(key)
+            return value if isinstance(value, dict) else fallback
+
+        return {
+            "content_analysis": section(
+                "content_analysis", {"error": "Invalid response format", "raw": response}
+            ),
+            "entities": section("entities", {"entities": []}),
+            "intents": section("intents", {"looking_for": [], "offering": []}),
+        }
@@ -6,7 +6,6 @@ class ConversationAnalyzer(BaseAgent):
     def __init__(self):
         super().__init__(
             name="conversation_analyzer",
-            model="gpt-4-turbo-preview",
             provider="openai",
             temperature=0.7
         )
@@ -1,14 +1,31 @@
-from typing import Dict, Any, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+import asyncio
+from functools import lru_cache
+import orjson
+import tiktoken
 from loguru import logger
 
+from app.core.config import settings
+
 from app.agents.content_analyzer import (
     ContentAnalyzerAgent,
     EntityExtractorAgent,
+    FusedAnalyzerAgent,
     IntentClassifierAgent,
 )
 
 
+@lru_cache(maxsize=4)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Tokenizer for a model, loaded once per process and shared by every orchestrator
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
 class AgentOrchestrator:
     """
     Orchestrates multiple agents to analyze recordings
@@ -18,12 +35,35 @@ class AgentOrchestrator:
         self.content_analyzer = ContentAnalyzerAgent()
         self.entity_extractor = EntityExtractorAgent()
         self.intent_classifier = IntentClassifierAgent()
+        self.fused_analyzer = FusedAnalyzerAgent()
+        # Load the tokenizer now rather than on the first request
+        self.encoding = get_encoding(self.fused_analyzer.model)
+
+    def fit_transcript(self, transcript: str) -> str:
+        """
+        Cut a transcript over MAX_TRANSCRIPT_TOKENS down to its head and tail -
+        tokenized once here, so the agents all get the same bounded text
+        """
+        max_tokens = settings.MAX_TRANSCRIPT_TOKENS
+        tokens = self.encoding.encode(transcript, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return transcript
+
+        logger.warning(f"Transcript of {len(tokens)} tokens truncated to {max_tokens}")
+        half = max_tokens // 2
+        return (
+            f"{self.encoding.decode(tokens[:half])}\n\n"
+            f"[... {len(tokens) - max_tokens} tokens omitted ...]\n\n"
+            f"{self.encoding.decode(tokens[-half:])}"
+        )
 
-    def analyze_recording(
+    async def analyze_recording(
         self,
         transcript: str,
         user_category: str = "general",
         parallel: bool = True,
+        legacy: bool = False,
+        owner_id: Optional[int] = None,
     ) -> Dict[str, Any]:
         """
         Run all agents on a transcript
@@ -32,23 +72,43 @@ class AgentOrchestrator:
             transcript: The conversation transcript
             user_category: User category (ceo_investor, student, general)
             parallel: Whether to run agents in parallel
+            legacy: Run the three agents separately instead of one fused call
+            owner_id: ID of the user who owns the recording - the semantic cache
+                only serves a user their own earlier analyses, and is skipped without one
 
         Returns:
             Combined results from all agents
         """
         logger.info("Starting orchestrated analysis")
 
-        input_data = {"transcript": transcript, "user_category": user_category}
+        input_data = {
+            "transcript": self.fit_transcript(transcript),
+            "user_category": user_category,
+            "cache_owner": f"user:{owner_id}" if owner_id is not None else None,
+        }
 
-        if parallel:
+        if parallel and not legacy:
+            # One LLM call covering all three analyses - the transcript is sent once
+            results = await self._run_fused(input_data)
+        elif parallel:
             # Run agents in parallel for faster processing
-            results = self._run_parallel(input_data)
+            results = await self._run_parallel(input_data)
         else:
             # Run agents sequentially
-            results = self._run_sequential(input_data)
+            results = await self._run_sequential(input_data)
+
+        combined_results = self.combine_results(results, transcript, user_category)
+
+        logger.info("Orchestrated analysis completed")
+        return combined_results
 
-        # Combine results
-        combined_results = {
+    def combine_results(
+        self, results: Dict[str, Any], transcript: str, user_category: str
+    ) -> Dict[str, Any]:
+        """
+        Combine per-agent results into the analysis returned to callers
+        """
+        return {
             "content_analysis": results.get("content_analyzer", {}),
             "entities": results.get("entity_extractor", {}),
             "intents": results.get("intent_classifier", {}),
@@ -61,43 +121,145 @@ class AgentOrchestrator:
             },
         }
 
-        logger.info("Orchestrated analysis completed")
-        return combined_results
+    async def _run_fused(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the fused agent and split its response into per-agent results
+        """
+        return self._split_fused(await self.fused_analyzer.aexecute(input_data))
 
-    def _run_parallel(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _split_fused(self, fused: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Run all agents in parallel using ThreadPoolExecutor
+        Per-agent results from a fused agent result envelope
         """
+        sections = {
+            "content_analyzer": "content_analysis",
+            "entity_extractor": "entities",
+            "intent_classifier": "intents",
+        }
+
         results = {}
+        for agent_name, key in sections.items():
+            result = dict(fused)
+            if fused["success"]:
+                result["results"] = fused["results"][key]
+            # One call - count its time once, not once per section
+            if results:
+                result["processing_time"] = 0
+            results[agent_name] = result
 
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit all agent tasks
-            future_to_agent = {
-                executor.submit(
-                    self.content_analyzer.execute, input_data
-                ): "content_analyzer",
-                executor.submit(
-                    self.entity_extractor.execute, input_data
-                ): "entity_extractor",
-                executor.submit(
-                    self.intent_classifier.execute, input_data
-                ): "intent_classifier",
-            }
-
-            # Collect results as they complete
-            for future in as_completed(future_to_agent):
-                agent_name = future_to_agent[future]
-                try:
-                    result = future.result()
-                    results[agent_name] = result
-                    logger.info(f"Agent '{agent_name}' completed")
-                except Exception as e:
-                    logger.error(f"Agent '{agent_name}' failed: {e}")
-                    results[agent_name] = {"error": str(e), "success": False}
+        return results
+
+    def submit_batch(
+        self, transcripts: List[str], user_category: str = "general"
+    ) -> str:
+        """
+        Queue fused analyses of transcripts on the OpenAI Batch API - half the
+        price of live calls, completed within 24h. For background jobs only;
+        the live UI uses analyze_recording
+
+        Args:
+            transcripts: Transcripts to analyze
+            user_category: User category (ceo_investor, student, general)
+
+        Returns:
+            Batch ID to pass to collect_batch
+        """
+        agent = self.fused_analyzer
+        lines = [
+            orjson.dumps(
+                agent.batch_request(
+                    str(index),
+                    {
+                        "transcript": self.fit_transcript(transcript),
+                        "user_category": user_category,
+                    },
+                )
+            )
+            for index, transcript in enumerate(transcripts)
+        ]
+
+        batch_file = agent.client.files.create(
+            file=("analysis_batch.jsonl", b"\n".join(lines)), purpose="batch"
+        )
+        batch = agent.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"Submitted analysis batch {batch.id} ({len(lines)} transcripts)")
+        return batch.id
+
+    def collect_batch(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Results of a batch from submit_batch, in transcript order
+
+        Returns:
+            None while the batch is still running, else one entry per transcript:
+            per-agent results as in analyze_recording, or {"error": ...}
+        """
+        agent = self.fused_analyzer
+        batch = agent.client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing"):
+            return None
+        if batch.status != "completed":
+            raise RuntimeError(f"Analysis batch {batch_id} {batch.status}")
+
+        outcomes: List[Dict[str, Any]] = [
+            {"error": "No response in batch output"}
+        ] * batch.request_counts.total
+        for output_file_id in (batch.output_file_id, batch.error_file_id):
+            if not output_file_id:
+                continue
+            for line in agent.client.files.content(output_file_id).text.splitlines():
+                row = orjson.loads(line)
+                index = int(row["custom_id"])
+                response = row.get("response") or {}
+                if row.get("error") or response.get("status_code") != 200:
+                    outcomes[index] = {"error": str(row.get("error") or response.get("body"))}
+                    continue
+
+                body = response["body"]
+                outcomes[index] = self._split_fused(
+                    {
+                        "agent_name": agent.name,
+                        "results": agent.parse_response(
+                            body["choices"][0]["message"]["content"]
+                        ),
+                        "model_used": body["model"],
+                        "processing_time": 0,
+                        "success": True,
+                    }
+                )
+
+        logger.info(f"Collected analysis batch {batch_id}")
+        return outcomes
+
+    async def _run_parallel(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run all agents concurrently on the event loop
+        """
+        agents = {
+            "content_analyzer": self.content_analyzer,
+            "entity_extractor": self.entity_extractor,
+            "intent_classifier": self.intent_classifier,
+        }
+        outcomes = await asyncio.gather(
+            *(agent.aexecute(input_data) for agent in agents.values()),
+            return_exceptions=True,
+        )
+
+        results = {}
+        for agent_name, outcome in zip(agents, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Agent '{agent_name}' failed: {outcome}")
+                results[agent_name] = {"error": str(outcome), "success": False}
+            else:
+                results[agent_name] = outcome
+                logger.info(f"Agent '{agent_name}' completed")
 
         return results
 
-    def _run_sequential(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _run_sequential(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Run all agents sequentially
         """
@@ -105,21 +267,21 @@ class AgentOrchestrator:
 
         # Run content analyzer
         try:
-            results["content_analyzer"] = self.content_analyzer.execute(input_data)
+            results["content_analyzer"] = await self.content_analyzer.aexecute(input_data)
         except Exception as e:
             logger.error(f"Content analyzer failed: {e}")
             results["content_analyzer"] = {"error": str(e), "success": False}
 
         # Run entity extractor
         try:
-            results["entity_extractor"] = self.entity_extractor.execute(input_data)
+            results["entity_extractor"] = await self.entity_extractor.aexecute(input_data)
         except Exception as e:
             logger.error(f"Entity extractor failed: {e}")
             results["entity_extractor"] = {"error": str(e), "success": False}
 
         # Run intent classifier
         try:
-            results["intent_classifier"] = self.intent_classifier.execute(input_data)
+            results["intent_classifier"] = await self.intent_classifier.aexecute(input_data)
         except Exception as e:
             logger.error(f"Intent classifier failed: {e}")
             results["intent_classifier"] = {"error": str(e), "success": False}
@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional
+from pathlib import Path
+import sqlite3
+import threading
+from functools import lru_cache
+
+import numpy as np
+from loguru import logger
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# MiniLM reads ~256 word pieces; longer text is embedded in windows and mean-pooled
+WINDOW_CHARS = 1000
+
+
+@lru_cache(maxsize=1)
+def get_embedder():
+    """
+    Load the sentence embedding model once per process, on first use
+    """
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Unit-length embedding of the whole text, so a dot product is the cosine similarity
+    """
+    windows = [text[i : i + WINDOW_CHARS] for i in range(0, len(text), WINDOW_CHARS)] or [""]
+    vectors = get_embedder().encode(windows, normalize_embeddings=True)
+    pooled = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+    return pooled / np.linalg.norm(pooled)
+
+
+class SemanticCache:
+    """
+    LLM responses keyed by an embedding of the prompt, persisted in SQLite and
+    searched in memory. Entries are scoped (per owner, agent and model) so no
+    user or agent is ever answered with another's output
+    """
+
+    def __init__(self, path: str, threshold: float):
+        self.threshold = threshold
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(scope TEXT NOT NULL, embedding BLOB NOT NULL, response TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._responses: Dict[str, List[str]] = {}
+        for scope, embedding, response in self.db.execute(
+            "SELECT scope, embedding, response FROM responses"
+        ):
+            self._add(scope, np.frombuffer(embedding, dtype=np.float32), response)
+
+    def _add(self, scope: str, vector: np.ndarray, response: str):
+        rows = self._vectors.get(scope)
+        self._vectors[scope] = vector[None] if rows is None else np.vstack([rows, vector])
+        self._responses.setdefault(scope, []).append(response)
+
+    def lookup(self, scope: str, vector: np.ndarray) -> Optional[str]:
+        """
+        Cached response whose prompt is at least `threshold` similar, or None
+        """
+        with self._lock:
+            rows = self._vectors.get(scope)
+            if rows is None:
+                return None
+            scores = rows @ vector
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                return None
+            logger.info(f"Semantic cache hit for '{scope}' (similarity {scores[best]:.3f})")
+            return self._responses[scope][best]
+
+    def store(self, scope: str, vector: np.ndarray, response: str):
+        with self._lock:
+            self._add(scope, vector, response)
+            with self.db:
+                self.db.execute(
+                    "INSERT INTO responses VALUES (?, ?, ?)",
+                    (scope, vector.astype(np.float32).tobytes(), response),
+                )
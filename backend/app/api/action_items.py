@@ -3,8 +3,8 @@ Action Items API endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import func, case, and_
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
@@ -76,8 +76,11 @@ async def list_action_items(
     """
     List all action items for the current user with optional filters
     """
-    # Build query - join with recordings to filter by user
-    query = db.query(ActionItem).join(Recording).filter(
+    # Build query - join with recordings to filter by user, loading each
+    # item's recording from the same join
+    query = db.query(ActionItem).join(Recording).options(
+        contains_eager(ActionItem.recording)
+    ).filter(
         Recording.user_id == current_user.id
     )
 
@@ -99,32 +102,8 @@ async def list_action_items(
 
     action_items = query.offset(skip).limit(limit).all()
 
-    # Build response with recording titles
-    results = []
-    for item in action_items:
-        recording = db.query(Recording).filter(Recording.id == item.recording_id).first()
-        results.append(ActionItemResponse(
-            id=item.id,
-            recording_id=item.recording_id,
-            recording_title=recording.title if recording else "Unknown",
-            action=item.action,
-            deadline=item.deadline,
-            deadline_type=item.deadline_type,
-            priority=item.priority,
-            action_type=item.action_type,
-            quote=item.quote,
-            mentioned_by=item.mentioned_by,
-            speaker_name=item.speaker_name,
-            timestamp_seconds=item.timestamp_seconds,
-            contact_email=item.contact_email,
-            contact_company=item.contact_company,
-            status=item.status,
-            completed_at=item.completed_at,
-            notes=item.notes,
-            created_at=item.created_at
-        ))
-
-    return results
+    # Build responses straight from the ORM rows (recording_title is a model property)
+    return [ActionItemResponse.model_validate(item) for item in action_items]
 
 
 @router.get("/stats", response_model=ActionItemStats)
@@ -135,30 +114,33 @@ async def get_action_item_stats(
     """
     Get statistics about action items for the current user
     """
-    # Get all action items for user
-    action_items = db.query(ActionItem).join(Recording).filter(
-        Recording.user_id == current_user.id
-    ).all()
-
     now = datetime.utcnow()
     today_end = now.replace(hour=23, minute=59, second=59)
     week_end = now + timedelta(days=7)
+    open_item = ActionItem.status.notin_(["completed", "cancelled"])
+
+    def count_where(*conditions):
+        # COUNT skips the NULLs case() yields for non-matching rows
+        return func.count(case((and_(*conditions), 1)))
+
+    # One aggregate query - the buckets are counted in the database, no rows are loaded
+    row = db.query(
+        func.count(ActionItem.id).label("total"),
+        count_where(ActionItem.status == "pending").label("pending"),
+        count_where(ActionItem.status == "in_progress").label("in_progress"),
+        count_where(ActionItem.status == "completed").label("completed"),
+        count_where(ActionItem.status == "cancelled").label("cancelled"),
+        count_where(ActionItem.priority == "high").label("high_priority"),
+        count_where(ActionItem.priority == "medium").label("medium_priority"),
+        count_where(ActionItem.priority == "low").label("low_priority"),
+        count_where(ActionItem.deadline < now, open_item).label("overdue"),
+        count_where(ActionItem.deadline >= now, ActionItem.deadline <= today_end, open_item).label("due_today"),
+        count_where(ActionItem.deadline >= now, ActionItem.deadline <= week_end, open_item).label("due_this_week"),
+    ).join(Recording).filter(
+        Recording.user_id == current_user.id
+    ).one()
 
-    stats = ActionItemStats(
-        total=len(action_items),
-        pending=sum(1 for item in action_items if item.status == "pending"),
-        in_progress=sum(1 for item in action_items if item.status == "in_progress"),
-        completed=sum(1 for item in action_items if item.status == "completed"),
-        cancelled=sum(1 for item in action_items if item.status == "cancelled"),
-        high_priority=sum(1 for item in action_items if item.priority == "high"),
-        medium_priority=sum(1 for item in action_items if item.priority == "medium"),
-        low_priority=sum(1 for item in action_items if item.priority == "low"),
-        overdue=sum(1 for item in action_items if item.deadline and item.deadline < now and item.status not in ["completed", "cancelled"]),
-        due_today=sum(1 for item in action_items if item.deadline and item.deadline <= today_end and item.deadline >= now and item.status not in ["completed", "cancelled"]),
-        due_this_week=sum(1 for item in action_items if item.deadline and item.deadline <= week_end and item.deadline >= now and item.status not in ["completed", "cancelled"])
-    )
-
-    return stats
+    return ActionItemStats(**row._asdict())
 
 
 @router.get("/{action_item_id}", response_model=ActionItemResponse)
@@ -170,7 +152,9 @@ async def get_action_item(
     """
     Get a specific action item by ID
     """
-    action_item = db.query(ActionItem).join(Recording).filter(
+    action_item = db.query(ActionItem).join(Recording).options(
+        contains_eager(ActionItem.recording)
+    ).filter(
         ActionItem.id == action_item_id,
         Recording.user_id == current_user.id
     ).first()
@@ -178,28 +162,7 @@ async def get_action_item(
     if not action_item:
         raise HTTPException(status_code=404, detail="Action item not found")
 
-    recording = db.query(Recording).filter(Recording.id == action_item.recording_id).first()
-
-    return ActionItemResponse(
-        id=action_item.id,
-        recording_id=action_item.recording_id,
-        recording_title=recording.title if recording else "Unknown",
-        action=action_item.action,
-        deadline=action_item.deadline,
-        deadline_type=action_item.deadline_type,
-        priority=action_item.priority,
-        action_type=action_item.action_type,
-        quote=action_item.quote,
-        mentioned_by=action_item.mentioned_by,
-        speaker_name=action_item.speaker_name,
-        timestamp_seconds=action_item.timestamp_seconds,
-        contact_email=action_item.contact_email,
-        contact_company=action_item.contact_company,
-        status=action_item.status,
-        completed_at=action_item.completed_at,
-        notes=action_item.notes,
-        created_at=action_item.created_at
-    )
+    return ActionItemResponse.model_validate(action_item)
 
 
 @router.patch("/{action_item_id}")
@@ -1,40 +1,160 @@
-from fastapi import APIRouter, HTTPException, status
+import asyncio
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
 from loguru import logger
+from sqlalchemy.orm import Session
 
-from app.models.schemas import AnalysisResponse
+from app.agents.orchestrator import AgentOrchestrator
+from app.core.database import get_db
+from app.models.database import ProcessingJob, Recording, User
+from app.services.analysis_batches import JOB_TYPE, AnalysisBatchService
+from app.services.auth import get_current_user
 
 router = APIRouter()
 
+# Processing job holding an analysis run live from the UI; regenerations use JOB_TYPE
+LIVE_JOB_TYPE = "analysis"
+
 
-@router.get("/{recording_id}", response_model=AnalysisResponse)
-async def get_analysis(recording_id: int):
+@router.get("/{recording_id}")
+async def get_analysis(
+    recording_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """
-    Get AI analysis results for a recording
+    Get AI analysis results for a recording - the latest completed analysis
 
     Returns:
     - Extracted entities (people, companies, locations)
-    - Identified interests and topics
+    - Content analysis: topics, interests, pain points and offerings
     - User intents (investment, partnership, etc.)
-    - Pain points and offerings
-    - Overall sentiment and summary
+    - Analysis metadata
     """
     logger.info(f"Fetching analysis for recording: {recording_id}")
 
-    # TODO: Retrieve analysis from database
+    recording = db.query(Recording).filter(
+        Recording.id == recording_id,
+        Recording.user_id == current_user.id
+    ).first()
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording not found")
+
+    job = db.query(ProcessingJob).filter(
+        ProcessingJob.recording_id == recording_id,
+        ProcessingJob.job_type.in_((LIVE_JOB_TYPE, JOB_TYPE)),
+        ProcessingJob.status == "completed"
+    ).order_by(ProcessingJob.completed_at.desc()).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Analysis for recording {recording_id} not found"
+        )
+
+    return {
+        "recording_id": recording_id,
+        **job.result,
+        "processed_at": job.completed_at,
+    }
+
+
+@router.post("/{recording_id}/analyze")
+async def analyze_recording(
+    recording_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyze a recording's transcript now, for the live UI
+
+    The agents' LLM calls are awaited on the event loop; the result is
+    stored as the recording's latest analysis and returned
+    """
+    logger.info(f"Analyzing recording: {recording_id}")
 
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Analysis for recording {recording_id} not found"
+    recording = db.query(Recording).filter(
+        Recording.id == recording_id,
+        Recording.user_id == current_user.id
+    ).first()
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if not recording.transcript or not (recording.transcript.full_text or "").strip():
+        raise HTTPException(status_code=400, detail="Recording has no transcript. Process it first.")
+
+    started_at = datetime.utcnow()
+    analysis = await AgentOrchestrator().analyze_recording(
+        recording.transcript.full_text, owner_id=current_user.id
+    )
+    errors = [
+        section.get("error", "failed")
+        for section in (analysis["content_analysis"], analysis["entities"], analysis["intents"])
+        if not section.get("success")
+    ]
+    if errors:
+        raise HTTPException(status_code=502, detail=f"Analysis failed: {errors[0]}")
+
+    job = ProcessingJob(
+        recording_id=recording_id,
+        job_type=LIVE_JOB_TYPE,
+        status="completed",
+        progress_percentage=100,
+        result=analysis,
+        started_at=started_at,
+        completed_at=datetime.utcnow(),
     )
+    db.add(job)
+    db.commit()
+
+    return {
+        "recording_id": recording_id,
+        **analysis,
+        "processed_at": job.completed_at,
+    }
 
 
 @router.post("/{recording_id}/regenerate", status_code=status.HTTP_202_ACCEPTED)
-async def regenerate_analysis(recording_id: int):
+async def regenerate_analysis(
+    recording_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """
     Regenerate analysis for a recording using latest LLM models
+
+    Runs on the OpenAI Batch API (half price, completed within 24h); the
+    results are stored on the processing job when the batch is reaped
     """
     logger.info(f"Regenerating analysis for recording: {recording_id}")
 
-    # TODO: Queue analysis regeneration job
+    recording = db.query(Recording).filter(
+        Recording.id == recording_id,
+        Recording.user_id == current_user.id
+    ).first()
+    if not recording:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if not recording.transcript or not (recording.transcript.full_text or "").strip():
+        raise HTTPException(status_code=400, detail="Recording has no transcript. Process it first.")
+
+    # One paid batch per recording at a time
+    pending = db.query(ProcessingJob).filter(
+        ProcessingJob.recording_id == recording_id,
+        ProcessingJob.job_type == JOB_TYPE,
+        ProcessingJob.status == "running"
+    ).first()
+    if pending:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Analysis regeneration already in progress (batch {pending.batch_id})"
+        )
+
+    # File upload and batch creation are blocking SDK calls
+    batch_id = await asyncio.to_thread(
+        AnalysisBatchService().queue_regeneration, [recording], db
+    )
 
-    return {"message": "Analysis regeneration queued", "recording_id": recording_id}
+    return {
+        "message": "Analysis regeneration queued",
+        "recording_id": recording_id,
+        "batch_id": batch_id,
+    }
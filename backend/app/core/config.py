@@ -36,6 +36,15 @@ class Settings(BaseSettings):
 
     # OpenAI
     OPENAI_API_KEY: str = ""
+    LLM_MODEL: str = "gpt-4o-mini"  # Default for the analysis agents - schema-guided extraction
+    MAX_TRANSCRIPT_TOKENS: int = 20000  # Longer transcripts are cut in the middle before analysis
+
+    # Semantic LLM cache - near-duplicate prompts reuse an agent's earlier response
+    # for the same user; calls without an owner never use it
+    ENABLE_SEMANTIC_CACHE: bool = False
+    SEMANTIC_CACHE_PATH: str = "data/llm_semantic_cache.db"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Cosine similarity
+    ANALYSIS_BATCH_POLL_SECONDS: int = 300  # How often regenerate-analysis batches are reaped
 
     # Anthropic
     ANTHROPIC_API_KEY: str = ""
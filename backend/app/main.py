@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -42,13 +44,20 @@ async def lifespan(app: FastAPI):
     elif settings.SENTRY_DSN:
         logger.warning("Sentry DSN configured but sentry_sdk not installed")
 
+    # Reap batched analysis regenerations in the background
+    from app.services.analysis_batches import poll_analysis_batches
+    batch_poller = asyncio.create_task(poll_analysis_batches())
+
     logger.info("Application started successfully")
 
     yield
 
     # Shutdown
     logger.info("Shutting down Lyncsea Platform...")
-    # Cleanup tasks here
+    batch_poller.cancel()
+
+    from app.agents.base_agent import close_http_client
+    await close_http_client()
 
 
 app = FastAPI(
@@ -5,7 +5,7 @@ Clean, modular design with proper relationships
 
 from sqlalchemy import (
     Column, Integer, String, Text, Boolean, Float, DateTime,
-    ForeignKey, Enum as SQLEnum, JSON
+    ForeignKey, Enum as SQLEnum, JSON, Index
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -142,13 +142,18 @@ class ProcessingJob(Base):
     recording_id = Column(Integer, ForeignKey("recordings.id"), nullable=False)
     job_type = Column(String(50), nullable=False)  # transcription, diarization, lead_extraction
     celery_task_id = Column(String(255), unique=True)
+    batch_id = Column(String(255), index=True)  # OpenAI Batch API job, for batched analysis
     status = Column(String(50), default="queued")
     progress_percentage = Column(Integer, default=0)
     error_message = Column(Text)
+    result = Column(JSON)  # Job output, e.g. analysis results
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Relationships
+    recording = relationship("Recording")
+
 
 class Event(Base):
     """Event discovered by AI agent"""
@@ -238,6 +243,10 @@ class LeadGenerationJob(Base):
 class ActionItem(Base):
     """Action items extracted from conversation transcripts"""
     __tablename__ = "action_items"
+    __table_args__ = (
+        # Covers the per-user stats aggregation (index-only scan)
+        Index("idx_action_items_stats", "recording_id", "status", "priority", "deadline"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     recording_id = Column(Integer, ForeignKey("recordings.id"), nullable=False)
@@ -272,4 +281,9 @@ class ActionItem(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    recording = relationship("Recording")
\ No newline at end of file
+    recording = relationship("Recording")
+
+    @property
+    def recording_title(self):
+        """Title of the source recording, read by ActionItemResponse"""
+        return self.recording.title if self.recording else "Unknown"
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Analysis Batch Service - regenerates recording analyses through the OpenAI
+Batch API and reaps the finished batches into processing_jobs
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.agents.orchestrator import AgentOrchestrator
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.database import ProcessingJob, Recording
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = "analysis_regeneration"
+
+
+class AnalysisBatchService:
+    """Queues analysis regeneration as batch jobs and stores their results"""
+
+    def __init__(self):
+        self.orchestrator = AgentOrchestrator()
+
+    def queue_regeneration(self, recordings: List[Recording], db: Session) -> str:
+        """
+        Submit one batch analyzing every recording's transcript
+
+        Args:
+            recordings: Recordings with transcripts
+            db: Database session
+
+        Returns:
+            The batch ID, stored on one processing job per recording
+        """
+        batch_id = self.orchestrator.submit_batch(
+            [recording.transcript.full_text for recording in recordings]
+        )
+
+        # Job order (by id) matches transcript order - collect_batch returns results the same way
+        for recording in recordings:
+            db.add(
+                ProcessingJob(
+                    recording_id=recording.id,
+                    job_type=JOB_TYPE,
+                    batch_id=batch_id,
+                    status="running",
+                    started_at=datetime.utcnow(),
+                )
+            )
+        db.commit()
+
+        logger.info(f"Queued analysis regeneration for {len(recordings)} recordings in batch {batch_id}")
+        return batch_id
+
+    def reap_batches(self, db: Session) -> int:
+        """
+        Store results of every finished regeneration batch
+
+        Returns:
+            Number of batches reaped
+        """
+        running = (
+            db.query(ProcessingJob)
+            .filter(ProcessingJob.job_type == JOB_TYPE, ProcessingJob.status == "running")
+            .order_by(ProcessingJob.id)
+            .all()
+        )
+        batches = {}
+        for job in running:
+            batches.setdefault(job.batch_id, []).append(job)
+
+        reaped = 0
+        for batch_id, jobs in batches.items():
+            if not self._claim(batch_id, db):
+                # Another worker's poller is collecting this batch
+                continue
+            try:
+                reaped += self._collect(batch_id, jobs, db)
+            except Exception as e:
+                # Network or API error - the batch may still finish; retried on the next poll
+                db.rollback()
+                logger.warning(f"Could not collect analysis batch {batch_id}, will retry: {e}")
+                self._release(batch_id, db)
+
+        return reaped
+
+    def _claim(self, batch_id: str, db: Session) -> bool:
+        """
+        Move a batch's jobs from running to collecting - atomic, so with several
+        app workers polling only one of them downloads and writes each batch
+        """
+        claimed = (
+            db.query(ProcessingJob)
+            .filter(ProcessingJob.batch_id == batch_id, ProcessingJob.status == "running")
+            .update({"status": "collecting"}, synchronize_session=False)
+        )
+        db.commit()
+        return claimed > 0
+
+    def _release(self, batch_id: str, db: Session):
+        """
+        Hand a claimed batch back to the pollers
+        """
+        db.query(ProcessingJob).filter(
+            ProcessingJob.batch_id == batch_id, ProcessingJob.status == "collecting"
+        ).update({"status": "running"}, synchronize_session=False)
+        db.commit()
+
+    def _collect(self, batch_id: str, jobs: List[ProcessingJob], db: Session) -> int:
+        """
+        Store a claimed batch's results, or release it while it is still running
+
+        Returns:
+            1 if the batch was reaped, else 0
+        """
+        try:
+            outcomes = self.orchestrator.collect_batch(batch_id)
+        except RuntimeError as e:
+            # Failed, expired or cancelled - there is no output to wait for
+            logger.error(f"Analysis batch {batch_id} failed: {e}")
+            for job in jobs:
+                job.status = "failed"
+                job.error_message = str(e)
+                job.completed_at = datetime.utcnow()
+            db.commit()
+            return 1
+
+        if outcomes is None:
+            self._release(batch_id, db)
+            return 0
+
+        for job, outcome in zip(jobs, outcomes):
+            job.completed_at = datetime.utcnow()
+            if "error" in outcome:
+                job.status = "failed"
+                job.error_message = outcome["error"]
+            else:
+                job.status = "completed"
+                job.progress_percentage = 100
+                job.result = self.orchestrator.combine_results(
+                    outcome, job.recording.transcript.full_text, "general"
+                )
+        db.commit()
+        return 1
+
+
+async def poll_analysis_batches():
+    """
+    Reap finished analysis batches every ANALYSIS_BATCH_POLL_SECONDS, for the app's lifetime
+    """
+    service = None
+
+    def reap():
+        nonlocal service
+        # Built here, not up front - a missing key or failed tokenizer download
+        # must not end the poller; it is retried on the next round
+        if service is None:
+            service = AnalysisBatchService()
+        db = SessionLocal()
+        try:
+            return service.reap_batches(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            reaped = await asyncio.to_thread(reap)
+            if reaped:
+                logger.info(f"Reaped {reaped} analysis batches")
+        except Exception as e:
+            logger.error(f"Analysis batch polling failed: {e}")
+        await asyncio.sleep(settings.ANALYSIS_BATCH_POLL_SECONDS)
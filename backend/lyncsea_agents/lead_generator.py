@@ -6,14 +6,19 @@ Clean implementation with CrewAI - No mock code
 
 import os
 import sys
-import json
+import orjson
 import logging
 import smtplib
+import atexit
+import threading
+import contextlib
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from crewai import Agent, Task, Crew, Process
 from crewai.tools import tool
@@ -39,12 +44,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger('lyncsea')
 
+MAX_TRANSCRIPT_CHARS = 120_000  # Longer transcripts keep their head and tail
+
+# The lead email's HTML lives in a template; the LLM only supplies its content
+email_templates = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / "templates"),
+    autoescape=select_autoescape(["html", "j2"])
+)
+
+
+def truncate_middle(text, max_chars=MAX_TRANSCRIPT_CHARS):
+    """Keep the head and tail of an over-long transcript - openings and wrap-ups carry the most signal"""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n\n[... {len(text) - max_chars} characters omitted ...]\n\n{text[-half:]}"
+
+
+@lru_cache(maxsize=8)
+def _read_transcript(file_path, mtime, size):
+    """File contents for one (mtime, size) version - the agents re-read the same transcript"""
+    return truncate_middle(Path(file_path).read_text(encoding="utf-8", errors="replace"))
+
 
 @tool("read_transcript")
 def read_transcript_tool(file_path: str) -> str:
     """Read and return transcript content from file"""
-    with open(file_path, 'r') as f:
-        return f.read()
+    stat = os.stat(file_path)
+    return _read_transcript(file_path, stat.st_mtime_ns, stat.st_size)
 
 
 @tool("get_current_date")
@@ -65,16 +92,60 @@ def save_leads_tool(leads_data: dict) -> str:
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = output_dir / f"leads_{timestamp}.json"
 
-    with open(output_file, 'w') as f:
-        json.dump(leads_data, f, indent=2)
+    output_file.write_bytes(orjson.dumps(leads_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
     logger.info(f"Leads saved to {output_file}")
     return str(output_file)
 
 
+# One logged-in SMTP connection, reused across sends while the server keeps it open
+_smtp_connection = None
+_smtp_settings = None
+_smtp_lock = threading.Lock()
+
+
+def _close_smtp():
+    """Quit the shared SMTP connection, if one is open"""
+    global _smtp_connection
+    if _smtp_connection is not None:
+        with contextlib.suppress(smtplib.SMTPException, OSError):
+            _smtp_connection.quit()
+        _smtp_connection = None
+
+
+atexit.register(_close_smtp)
+
+
+def _get_smtp(smtp_server, smtp_port, email_user, email_password):
+    """Logged-in SMTP connection - the open one if it still answers NOOP, otherwise a new one"""
+    global _smtp_connection, _smtp_settings
+    settings = (smtp_server, smtp_port, email_user)
+    if _smtp_connection is not None:
+        if _smtp_settings == settings:
+            with contextlib.suppress(smtplib.SMTPException, OSError):
+                if _smtp_connection.noop()[0] == 250:
+                    return _smtp_connection
+        _close_smtp()
+
+    # Use SSL for port 465, TLS for port 587
+    if smtp_port == 465:
+        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+    else:
+        server = smtplib.SMTP(smtp_server, smtp_port)
+        server.starttls()
+
+    server.login(email_user, email_password)
+    _smtp_connection, _smtp_settings = server, settings
+    return server
+
+
 @tool("send_email")
-def send_email_tool(recipient: str, subject: str, html_body: str) -> str:
-    """Send HTML formatted email via SMTP"""
+def send_email_tool(recipient: str, subject: str, payload: dict) -> str:
+    """
+    Send the lead insights email via SMTP. payload holds: summary (str), people (list of
+    {name, role, company, linkedin, email}), opportunities (list of {type, description,
+    priority: high/medium/low}), action_items (list of str), links (list of {label, url})
+    """
     load_dotenv(override=True)
     email_user = os.getenv("EMAIL_USER")
     email_password = os.getenv("EMAIL_PASSWORD")
@@ -90,18 +161,11 @@ def send_email_tool(recipient: str, subject: str, html_body: str) -> str:
     msg['To'] = recipient
     msg['Subject'] = subject
 
+    html_body = email_templates.get_template("lead_email.html.j2").render(**payload)
     msg.attach(MIMEText(html_body, 'html'))
 
-    # Use SSL for port 465, TLS for port 587
-    if smtp_port == 465:
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-    else:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-
-    server.login(email_user, email_password)
-    server.send_message(msg)
-    server.quit()
+    with _smtp_lock:
+        _get_smtp(smtp_server, smtp_port, email_user, email_password).send_message(msg)
 
     logger.info(f"Email sent to {recipient} via {smtp_server}")
     return f"Email sent successfully to {recipient}"
@@ -116,6 +180,8 @@ class LyncseaCrew:
             raise ValueError("OPENAI_API_KEY not found in .env")
 
         os.environ["OPENAI_API_KEY"] = self.openai_api_key
+        # CrewAI agents use OPENAI_MODEL_NAME; a small model handles this schema-guided extraction
+        os.environ.setdefault("OPENAI_MODEL_NAME", "gpt-4o-mini")
 
     def create_agents(self):
         """Create specialized agents"""
@@ -158,8 +224,8 @@ class LyncseaCrew:
         # Agent 4: Email Sender
         email_sender = Agent(
             role='Communication Manager',
-            goal='Create beautifully formatted HTML emails with lead insights',
-            backstory='Expert at crafting visually appealing, professional business communications with proper formatting and color coding',
+            goal='Summarize lead insights into clear, well-structured email content',
+            backstory='Expert at concise, professional business communications that highlight who to contact and why',
             tools=[send_email_tool],
             verbose=False,
             allow_delegation=False
@@ -185,7 +251,7 @@ class LyncseaCrew:
             expected_output="Structured analysis of transcript with speakers, topics, companies, needs, and offers"
         )
 
-        # Task 2: Generate leads
+        # Task 2: Generate leads - runs asynchronously, alongside the research task
         generate_task = Task(
             description="""⚠️ CRITICAL RULES - READ CAREFULLY:
 
@@ -269,48 +335,37 @@ class LyncseaCrew:
             REMEMBER: Empty results are BETTER than fake results. Quality over quantity.""",
             agent=lead_generator,
             expected_output="ACCURATE lead opportunities (or empty arrays) saved to JSON file with evidence quotes and properly formatted dates",
-            context=[read_task]
+            context=[read_task],
+            async_execution=True
         )
 
-        # Task 3: Research contacts
+        # Task 3: Research contacts - needs only the transcript analysis, so it
+        # doesn't wait for lead generation
         research_task = Task(
-            description="""For each person and company identified, research and find:
+            description="""For each person and company identified in the transcript analysis, research and find:
             - LinkedIn profile URLs
             - Company websites
             - Professional email addresses (if publicly available)
             - Recent news or updates about the companies
 
-            Focus on the high-priority leads first. Return this enriched data.""",
+            Focus on the people and companies most central to the conversation first. Return this enriched data.""",
             agent=researcher,
             expected_output="Contact information and online profiles for identified leads",
-            context=[read_task, generate_task]
+            context=[read_task]
         )
 
-        # Task 4: Send formatted email
+        # Task 4: Send formatted email - waits for both lead generation and research
         email_task = Task(
-            description=f"""Create and send a beautifully formatted HTML email to {recipient_email}.
+            description=f"""Send the lead insights to {recipient_email} with the send_email tool.
 
             Subject: 🎯 Lead Insights from Networking Event - {{date}}
 
-            Use this HTML structure with color coding:
-
-            - Header: Use #2C3E50 background with white text
-            - High priority items: #E74C3C (red)
-            - Medium priority: #F39C12 (orange)
-            - Low priority: #27AE60 (green)
-            - Section headers: #3498DB (blue), bold, 18px
-            - Body text: #34495E, 14px
-
-            Include sections:
-            1. Executive Summary (2-3 lines)
-            2. 👥 Key People to Reach (with their roles, companies, LinkedIn, email if found)
-            3. 🎯 Opportunities (color-coded by priority)
-            4. 📋 Action Items (numbered list)
-            5. 🔗 Useful Links (company websites, profiles)
-
-            Make it visually appealing and professional. Use the send_email tool with HTML content.""",
+            payload is JSON, not HTML - the tool renders the email: summary (2-3 lines),
+            people [{{name, role, company, linkedin, email}}], opportunities
+            [{{type, description, priority: high/medium/low}}], action_items [str],
+            links [{{label, url}}]. Leave out fields you have no data for.""",
             agent=email_sender,
-            expected_output=f"Professional HTML email sent to {recipient_email}",
+            expected_output=f"Lead insights email sent to {recipient_email}",
             context=[read_task, generate_task, research_task]
         )
 
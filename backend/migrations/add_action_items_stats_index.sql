@@ -0,0 +1,5 @@
+-- Add composite index for action item stats
+-- Lets the per-user stats aggregation run as an index-only scan
+
+CREATE INDEX IF NOT EXISTS idx_action_items_stats
+ON action_items(recording_id, status, priority, deadline);
@@ -0,0 +1,15 @@
+-- Add batch_id and result columns to processing_jobs table
+-- Analysis regeneration runs on the OpenAI Batch API; the poller reaps
+-- finished batches by batch_id and stores the analysis in result
+
+ALTER TABLE processing_jobs
+ADD COLUMN IF NOT EXISTS batch_id VARCHAR(255);
+
+ALTER TABLE processing_jobs
+ADD COLUMN IF NOT EXISTS result JSONB;
+
+CREATE INDEX IF NOT EXISTS ix_processing_jobs_batch_id ON processing_jobs(batch_id);
+
+-- Add comments to describe the columns
+COMMENT ON COLUMN processing_jobs.batch_id IS 'OpenAI Batch API job ID for batched analysis regeneration';
+COMMENT ON COLUMN processing_jobs.result IS 'Job output, e.g. the regenerated analysis as JSON';